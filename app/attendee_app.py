@@ -1,8 +1,13 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from pagination import paginate
+from conditional import conditional
 from marshmallow import Schema, fields, validate
+from rollup import forget_attendee
+from inventory import release_sold
 from sqlalchemy import Column, Integer, String
+from changes import log_cascade
 
 attendee_bp = Blueprint('attendee_bp', __name__)
 
@@ -32,11 +37,10 @@ attendees_schema = AttendeeSchema(many=True)
 curl http://localhost:5000/attendees
 """
 @attendee_bp.route('/attendees', methods=['GET'])
+@conditional('attendee')
 def get_attendees():
-    all_attendees = Attendee.query.all()
-    if not all_attendees:
-        return jsonify({"Error": "Attendees not found"}), 404
-    return jsonify(attendees_schema.dump(all_attendees)), 200
+    return paginate(Attendee.query, attendees_schema, "Attendees not found",
+                    filters=('att_email',))
 
 
 
@@ -45,6 +49,7 @@ def get_attendees():
 curl http://localhost:5000/attendees/<attendee_id>
 """
 @attendee_bp.route('/attendees/<int:att_id>', methods=['GET'])
+@conditional('attendee')
 def get_attendee(att_id):
     attendee = Attendee.query.get(att_id)
     if attendee:
@@ -129,6 +134,8 @@ def delete_attendee(att_id):
     if not attendee:
         return jsonify({"Error": "Attendee not found"}), 404
     
+    release_sold(forget_attendee(att_id))
+    log_cascade(Attendee, att_id)
     db.session.delete(attendee)
     db.session.commit()
     return jsonify({"Message": "Attendee deleted"}), 200
@@ -0,0 +1,127 @@
+# Header
+import os
+import threading
+import time
+from collections import OrderedDict
+from use_db import db
+
+"""
+Read-through cache for small reference tables (ticket_status, venue,
+supplier, event). Write handlers use exists(Model, pk) instead of
+Model.query.get(pk) for foreign key checks, and the PUT/DELETE handlers of
+those tables call invalidate(Model, pk). A hit can outlive a delete served
+by another process for up to CACHE_TTL seconds: the write handlers catch
+the IntegrityError of the insert and call recheck() to answer 404.
+
+The default backend is an in-process LRU with a TTL. Set CACHE_BACKEND=redis
+(and CACHE_REDIS_URL) to share entries, and therefore invalidations, across
+pods.
+"""
+
+CACHE_TTL = int(os.getenv('CACHE_TTL', 300))
+CACHE_SIZE = int(os.getenv('CACHE_SIZE', 10000))
+
+
+class LocalBackend:
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while self.maxsize and len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisBackend:
+    def __init__(self, url, ttl=CACHE_TTL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else value.decode()
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(key, value, ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def clear(self):
+        for key in self.client.scan_iter('ref:*'):
+            self.client.delete(key)
+
+
+def make_backend(maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+    if os.getenv('CACHE_BACKEND', 'local') == 'redis':
+        return RedisBackend(os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'), ttl=ttl)
+    return LocalBackend(maxsize=maxsize, ttl=ttl)
+
+
+backend = make_backend()
+
+
+def cache_key(model, pk):
+    if isinstance(pk, (tuple, list)):
+        pk = ':'.join(str(part) for part in pk)
+    return f"ref:{model.__tablename__}:{pk}"
+
+
+def exists(model, pk):
+    """True if the row exists; only hits are cached, so a new row is seen at once."""
+    if pk is None:
+        return False
+    key = cache_key(model, pk)
+    if backend.get(key):
+        return True
+    found = db.session.get(model, pk) is not None
+    if found:
+        backend.set(key, '1')
+    return found
+
+
+def invalidate(model, pk):
+    backend.delete(cache_key(model, pk))
+
+
+def recheck(*references):
+    """After a foreign key error: evict the (Model, pk, error) references and return the error of one that is gone.
+
+    References with pk None (a field the request did not set) are skipped.
+    """
+    references = [reference for reference in references if reference[1] is not None]
+    for model, pk, error in references:
+        invalidate(model, pk)
+    for model, pk, error in references:
+        if not exists(model, pk):
+            return error
+    return None
@@ -0,0 +1,199 @@
+# Header
+import datetime
+import threading
+from use_db import db
+from sqlalchemy import Column, BigInteger, Integer, String, Enum, DateTime, Index, DDL, bindparam, event, inspect, delete, select, update
+from sqlalchemy.orm import Session
+
+"""
+Transactional outbox: every insert, update and delete of an API entity adds
+a change_log row (entity, pk, op) in the same transaction, so the feed at
+GET /changes (changes_app.py) only ever shows committed writes.
+
+The rows are written without a seq (AUTO_INCREMENT change_id only), so
+writers share no counter. relay() numbers them after they are committed, in
+change_id order, continuing from change_sequence: a transaction still open
+cannot get a lower seq than one a consumer already read, because it has no
+seq until relay() sees it committed. Only relays lock the change_sequence
+row, one at a time; the others skip it. GET /changes relays before it
+reads.
+
+ORM writes are picked up from the flush; the bulk INSERT paths
+(POST /purchases/bulk, the intake workers, ticket minting) call
+log_changes() with the keys they wrote. The delete handlers call
+log_cascade() first, for the rows ON DELETE CASCADE removes with the entity.
+"""
+
+# Tables served by the blueprints
+ENTITIES = {
+    'attendee', 'event', 'event_venue', 'purchase', 'staff', 'staff_venue',
+    'supplier', 'ticket', 'ticket_status', 'venue',
+}
+CHUNK = 1000
+
+# Notified after a commit that logged changes, to wake up long-polls in this process
+committed = threading.Condition()
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# SQLAlchemy Model
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    change_id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    # NULL until relay() numbers the committed row
+    seq = Column(BigInteger().with_variant(Integer, 'sqlite'))
+    entity = Column(String(30), nullable=False)
+    pk = Column(String(64), nullable=False)
+    op = Column(Enum('insert', 'update', 'delete'), nullable=False)
+    changed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_change_seq', 'seq', unique=True),
+        Index('idx_change_entity', 'entity', 'seq'),
+        Index('idx_change_time', 'changed_at'),
+    )
+
+
+class ChangeSequence(db.Model):
+    __tablename__ = 'change_sequence'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    seq = Column(BigInteger().with_variant(Integer, 'sqlite'), nullable=False, default=0)
+
+
+# The row relay() locks, for databases made by create_all (init.sql and the migrations insert it)
+event.listen(ChangeSequence.__table__, 'after_create', DDL("INSERT INTO change_sequence (id, seq) VALUES (1, 0)"))
+
+
+def change(entity, pk, op, now):
+    if isinstance(pk, (tuple, list)):
+        pk = ':'.join(str(part) for part in pk)
+    return {'entity': entity, 'pk': str(pk), 'op': op, 'changed_at': now}
+
+
+def write(session, rows):
+    """Keep rows for the commit, which inserts them (insert_changes)."""
+    session.info.setdefault('pending_changes', []).extend(rows)
+
+
+def inserted_ids(result, size):
+    """Ids of the rows of one multi-row INSERT (a "simple insert": InnoDB gives them consecutive ids)."""
+    # MySQL reports the first id of a multi-row INSERT, SQLite the last one
+    if db.session.get_bind().dialect.name == 'mysql':
+        first = result.lastrowid
+    else:
+        first = result.lastrowid - size + 1
+    return range(first, first + size)
+
+
+def log_changes(entity, pks, op):
+    """Log writes made with bulk statements, which the flush does not see."""
+    now = utcnow()
+    rows = [change(entity, pk, op, now) for pk in pks]
+    if rows:
+        write(db.session, rows)
+
+
+def log_cascade(model, pk):
+    """Call before deleting the row pk of model: logs the deletes of the rows ON DELETE CASCADE takes with it."""
+    (column,) = model.__table__.primary_key.columns
+    pending = [(model.__table__, [column == pk])]
+    while pending:
+        table, criteria = pending.pop()
+        for child in db.metadata.tables.values():
+            if child.name not in ENTITIES:
+                continue
+            for fk in child.foreign_keys:
+                if fk.column.table is table and fk.ondelete == 'CASCADE':
+                    child_criteria = [fk.parent.in_(select(fk.column).where(*criteria))]
+                    keys = db.session.execute(select(*child.primary_key.columns).where(*child_criteria))
+                    log_changes(child.name, [key[0] if len(key) == 1 else tuple(key) for key in keys], 'delete')
+                    pending.append((child, child_criteria))
+
+
+@event.listens_for(Session, 'after_flush')
+def log_flush(session, flush_context):
+    now = utcnow()
+    rows = []
+    for op, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            entity = getattr(obj, '__tablename__', None)
+            if entity not in ENTITIES:
+                continue
+            if op == 'update' and not session.is_modified(obj, include_collections=False):
+                continue
+            state = inspect(obj)
+            rows.append(change(entity, state.mapper.primary_key_from_instance(obj), op, now))
+    if rows:
+        write(session, rows)
+
+
+@event.listens_for(Session, 'before_commit')
+def insert_changes(session):
+    # Flush first, the last flush may log changes too
+    session.flush()
+    rows = session.info.pop('pending_changes', None)
+    if not rows:
+        return
+    stmt = ChangeLog.__table__.insert()
+    connection = session.connection(bind_arguments={'clause': stmt})
+    for start in range(0, len(rows), CHUNK):
+        connection.execute(stmt, rows[start:start + CHUNK])
+    session.info['logged_changes'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def notify_committed(session):
+    if session.info.pop('logged_changes', None):
+        with committed:
+            committed.notify_all()
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changes(session):
+    session.info.pop('pending_changes', None)
+    session.info.pop('logged_changes', None)
+
+
+def relay(batch=CHUNK):
+    """Number the committed changes that have no seq yet, oldest change_id first; returns how many.
+
+    Runs on the primary, batch rows per transaction of its own. Returns at
+    once when another relay holds change_sequence: it numbers them instead.
+    """
+    table = ChangeLog.__table__
+    numbered = 0
+    while True:
+        with db.engine.begin() as connection:
+            last = connection.execute(
+                select(ChangeSequence.seq).where(ChangeSequence.id == 1).with_for_update(skip_locked=True)
+            ).scalar()
+            if last is None:
+                return numbered
+            # Read after the lock: every change committed before the last relay's commit is numbered
+            ids = connection.execute(
+                select(table.c.change_id).where(table.c.seq.is_(None)).order_by(table.c.change_id).limit(batch)
+            ).scalars().all()
+            if not ids:
+                return numbered
+            connection.execute(
+                update(table).where(table.c.change_id == bindparam('b_change_id'), table.c.seq.is_(None))
+                .values(seq=bindparam('b_seq')),
+                [{'b_change_id': change_id, 'b_seq': seq} for seq, change_id in enumerate(ids, last + 1)]
+            )
+            connection.execute(
+                update(ChangeSequence).where(ChangeSequence.id == 1).values(seq=last + len(ids))
+            )
+        numbered += len(ids)
+        if len(ids) < batch:
+            return numbered
+
+
+def purge(older_than):
+    """Delete change records older than older_than seconds."""
+    cutoff = utcnow() - datetime.timedelta(seconds=older_than)
+    result = db.session.execute(delete(ChangeLog).where(ChangeLog.changed_at < cutoff))
+    db.session.commit()
+    return result.rowcount
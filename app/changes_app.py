@@ -0,0 +1,114 @@
+# Header
+import time
+import click
+from flask import Blueprint, request, jsonify, current_app
+from use_db import db
+from pagination import PaginationError, parse_limit, wants_stream, stream
+from changes import ChangeLog, ENTITIES, committed, relay, purge
+
+changes_bp = Blueprint('changes_bp', __name__, cli_group='changes')
+
+COLUMNS = (ChangeLog.seq, ChangeLog.entity, ChangeLog.pk, ChangeLog.op, ChangeLog.changed_at)
+
+
+def dump(row):
+    return {
+        "seq": row.seq,
+        "entity": row.entity,
+        "pk": row.pk,
+        "op": row.op,
+        "changed_at": row.changed_at.isoformat(),
+    }
+
+
+def parse_since():
+    since = request.args.get('since', '0')
+    if not since.isdigit():
+        raise PaginationError("since must be a change sequence number")
+    return int(since)
+
+
+def parse_entities():
+    entity = request.args.get('entity')
+    if not entity:
+        return None
+    names = [name.strip() for name in entity.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ENTITIES]
+    if unknown:
+        raise PaginationError(f"Unknown entity: {', '.join(unknown)}")
+    return names
+
+
+def parse_wait():
+    wait = request.args.get('wait', '0')
+    try:
+        wait = float(wait)
+    except ValueError:
+        raise PaginationError("wait must be a number of seconds")
+    return max(0.0, min(wait, current_app.config['CHANGES_MAX_WAIT']))
+
+
+def changes_query(since, entities):
+    query = db.session.query(ChangeLog).with_entities(*COLUMNS).filter(ChangeLog.seq > since)
+    if entities:
+        query = query.filter(ChangeLog.entity.in_(entities))
+    return query.order_by(ChangeLog.seq)
+
+
+def wait_for_changes(query, limit, wait):
+    """Poll until query returns rows or wait seconds pass.
+
+    Commits in this process wake the loop up at once, the ones made by other
+    pods are seen within CHANGES_POLL_INTERVAL seconds.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        relay()
+        rows = query.limit(limit).all()
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            return rows
+        # End the transaction: the next poll reads a fresh snapshot and the
+        # connection goes back to the pool while we wait
+        db.session.rollback()
+        with committed:
+            committed.wait(min(remaining, current_app.config['CHANGES_POLL_INTERVAL']))
+
+
+# Endpoints
+"""
+-> GET committed inserts, updates and deletes of every entity, oldest first (changes get their seq
+when a request to /changes first sees them committed, see changes.relay)
+Options: since=<seq> (changes after this one, default 0), limit=<n>, entity=<comma separated tables>,
+wait=<seconds> (long-poll: hold the request until a change arrives, at most CHANGES_MAX_WAIT),
+stream=1 (every change after since as NDJSON)
+curl "http://localhost:5000/changes?since=0&limit=500"
+curl "http://localhost:5000/changes?since=<next>&wait=20"
+The response's "next" is the since of the following call.
+"""
+@changes_bp.route('/changes', methods=['GET'])
+def get_changes():
+    try:
+        since = parse_since()
+        query = changes_query(since, parse_entities())
+        if wants_stream():
+            relay()
+            return stream(query, dump), 200
+        limit = parse_limit()
+        wait = parse_wait()
+    except PaginationError as e:
+        return jsonify({"Error": str(e)}), 400
+
+    rows = wait_for_changes(query, limit, wait)
+    changes = [dump(row) for row in rows]
+    return jsonify({"changes": changes, "next": changes[-1]['seq'] if changes else since}), 200
+
+
+# flask --app "main:create_app()" changes purge --older-than 604800
+@changes_bp.cli.command('purge')
+@click.option('--older-than', type=int, default=None, help="Seconds to keep (default CHANGES_RETENTION)")
+def purge_changes(older_than):
+    """Delete old change records; consumers behind them must resync."""
+    if older_than is None:
+        older_than = current_app.config['CHANGES_RETENTION']
+    click.echo(f"Deleted {purge(older_than)} change records")
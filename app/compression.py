@@ -0,0 +1,85 @@
+# Header
+import gzip
+import zlib
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Negotiated response compression: br (when the brotli package is installed)
+or gzip, picked from Accept-Encoding.
+
+curl --compressed http://localhost:5000/tickets?limit=1000
+curl -H "Accept-Encoding: br" "http://localhost:5000/purchases?stream=1" | brotli -d
+
+Only JSON, NDJSON and text bodies of at least COMPRESS_MIN_SIZE bytes are
+compressed. Streamed responses (?stream=1 exports) are compressed on the fly
+and flushed every COMPRESS_STREAM_FLUSH input bytes, so the client keeps
+receiving rows while the export runs.
+"""
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    candidates = [('br', 1), ('gzip', 0)] if brotli is not None else [('gzip', 0)]
+    quality, _, encoding = max((accepted[name], preference, name) for name, preference in candidates)
+    return encoding if quality > 0 else None
+
+
+def compressor(encoding, config):
+    """(compress, flush, finish) functions of an incremental compressor."""
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        return stream.process, stream.flush, stream.finish
+    stream = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)  # 31: gzip container
+    return stream.compress, lambda: stream.flush(zlib.Z_SYNC_FLUSH), stream.flush
+
+
+def compress_stream(chunks, encoding, config):
+    compress, flush, finish = compressor(encoding, config)
+    pending = 0
+    for chunk in chunks:
+        data = compress(chunk)
+        pending += len(chunk)
+        if pending >= config['COMPRESS_STREAM_FLUSH']:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
+
+
+def compress_response(response):
+    config = current_app.config
+    if (not config['COMPRESS_ENABLED'] or request.method == 'HEAD'
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding, config)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY']))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
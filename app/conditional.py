@@ -0,0 +1,171 @@
+# Header
+import calendar
+import datetime
+import hashlib
+import random
+import time
+from functools import wraps
+from email.utils import formatdate
+from flask import request, make_response, current_app
+from sqlalchemy import Column, String, BigInteger, Integer, DateTime, event, select, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+from use_db import db
+
+"""
+Conditional GET (ETag / Last-Modified) for the read endpoints.
+
+Every table has a version counter in table_version, split into SHARDS rows
+summed when read. Once a commit is done, it bumps one random shard of each
+table it wrote to, plus the tables that depend on it through ON
+DELETE/UPDATE CASCADE foreign keys, in a transaction of its own: the write
+transaction locks no shared row, and concurrent bumps of one table rarely
+meet on a shard. Every process and pod (and the CLI commands) sees a write
+a moment after it is committed; a GET in between answers with the previous
+ETag once more. A GET decorated with @conditional('table', ...) answers
+"If-None-Match" / "If-Modified-Since" with 304 before running a query when
+none of its tables changed.
+
+curl -i http://localhost:5000/events
+curl -i -H 'If-None-Match: W/"<etag>"' http://localhost:5000/events
+
+Tables listed in expanded=(...) only count when the request has ?expand=,
+so nested views do not make the plain collection change more often.
+"""
+
+# Last-Modified of a table that has no counter row yet
+started = time.time()
+SHARDS = 16
+
+
+# SQLAlchemy Model
+class TableVersion(db.Model):
+    __tablename__ = 'table_version'
+    table_name = Column(String(64), primary_key=True)
+    shard = Column(Integer, primary_key=True, autoincrement=False, default=0)
+    version = Column(BigInteger().with_variant(Integer, 'sqlite'), nullable=False, default=0)
+    modified_at = Column(DateTime, nullable=False)
+
+
+def dependents(table):
+    found = {table}
+    pending = [table]
+    while pending:
+        parent = pending.pop()
+        for child in db.metadata.tables.values():
+            if child.name in found:
+                continue
+            for fk in child.foreign_keys:
+                if fk.column.table.name == parent and 'CASCADE' in (fk.ondelete, fk.onupdate):
+                    found.add(child.name)
+                    pending.append(child.name)
+                    break
+    return found
+
+
+def bump(tables):
+    """Increment one random shard of each table's counter on the primary; sorted, so concurrent bumps cannot deadlock."""
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    rows = [
+        {'table_name': table, 'shard': random.randrange(SHARDS), 'version': 1, 'modified_at': now}
+        for table in sorted(tables)
+    ]
+    column = TableVersion.__table__.c.version
+    if db.engine.dialect.name == 'mysql':
+        stmt = mysql.insert(TableVersion).values(rows)
+        stmt = stmt.on_duplicate_key_update(version=column + 1, modified_at=stmt.inserted.modified_at)
+    else:
+        stmt = sqlite.insert(TableVersion).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['table_name', 'shard'],
+            set_={'version': column + 1, 'modified_at': stmt.excluded.modified_at}
+        )
+    with db.engine.begin() as connection:
+        connection.execute(stmt)
+
+
+def changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def track_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            changed_tables(session).add(table)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def track_statement(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements never go through the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.local_table.name != TableVersion.__tablename__:
+            changed_tables(orm_execute_state.session).add(mapper.local_table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def bump_committed(session):
+    tables = session.info.pop('changed_tables', None)
+    if not tables:
+        return
+    try:
+        bump(set().union(*(dependents(table) for table in tables)))
+    except SQLAlchemyError:
+        # The write is committed: its tables keep their ETags until the next write bumps them
+        current_app.logger.exception("Could not bump the versions of %s", ', '.join(sorted(tables)))
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_rolled_back(session):
+    session.info.pop('changed_tables', None)
+
+
+def table_state(tables):
+    """Read in the request's session, before the view: a GET on a replica gets the replica's counters."""
+    rows = db.session.execute(
+        select(TableVersion.table_name,
+               func.sum(TableVersion.version).label('version'),
+               func.max(TableVersion.modified_at).label('modified_at'))
+        .where(TableVersion.table_name.in_(tables))
+        .group_by(TableVersion.table_name)
+    )
+    found = {row.table_name: row for row in rows}
+    counters = [f"{table}:{found[table].version if table in found else 0}" for table in tables]
+    modified = [
+        calendar.timegm(found[table].modified_at.timetuple()) if table in found else started
+        for table in tables
+    ]
+    return counters, max(modified)
+
+
+def conditional(*tables, expanded=()):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            read = tables + tuple(expanded) if request.args.get('expand') else tables
+            counters, modified = table_state(read)
+            key = '|'.join([*counters, request.full_path, request.headers.get('Accept', '')])
+            etag = hashlib.sha1(key.encode()).hexdigest()[:24]
+            modified = int(modified)
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                fresh = since is not None and since.timestamp() >= modified
+
+            if fresh:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Last-Modified'] = formatdate(modified, usegmt=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -1,9 +1,85 @@
 import os
+import tempfile
+from db_pool import TimedQueuePool
+
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes')
+
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = (
+    # DATABASE_URL overrides the MySQL settings, e.g. sqlite:////tmp/bench.db for bench/
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or (
         f"mysql+pymysql://{os.getenv('MYSQL_USER')}:{os.getenv('MYSQL_PASSWORD')}@"
         f"{os.getenv('MYSQL_HOST')}:{os.getenv('MYSQL_PORT')}/{os.getenv('MYSQL_DATABASE')}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Read replicas (routing.py): DATABASE_REPLICA_URLS="url,url" or MYSQL_REPLICA_HOSTS="host:port,..."
+    # with the primary's credentials. GET requests read from one of them; a client that
+    # wrote reads from the primary for REPLICA_STICKY_SECONDS.
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()] or [
+        f"mysql+pymysql://{os.getenv('MYSQL_USER')}:{os.getenv('MYSQL_PASSWORD')}@"
+        f"{host.strip()}/{os.getenv('MYSQL_DATABASE')}"
+        for host in os.getenv('MYSQL_REPLICA_HOSTS', '').split(',') if host.strip()
+    ]
+    SQLALCHEMY_BINDS = {f'replica{i}': url for i, url in enumerate(DATABASE_REPLICA_URLS, 1)}
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+    # Connection pool, per gunicorn worker: pool_size should cover GUNICORN_THREADS.
+    # pool_recycle stays below MySQL's wait_timeout so idle connections are replaced
+    # before the server drops them; pool_pre_ping catches the ones dropped anyway.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 8)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 4)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+    }
+    if SQLALCHEMY_DATABASE_URI.startswith('mysql'):
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            'read_timeout': int(os.getenv('DB_READ_TIMEOUT', 30)),
+            'write_timeout': int(os.getenv('DB_WRITE_TIMEOUT', 30)),
+        }
+
+    # Application factory (main.py)
+    APP_ROLE = os.getenv('APP_ROLE', 'all')
+    APP_BLUEPRINTS = [name.strip() for name in os.getenv('APP_BLUEPRINTS', '').split(',') if name.strip()]
+    DB_CREATE_ALL = env_bool('DB_CREATE_ALL', False)
+
+    # Request instrumentation (metrics.py)
+    METRICS_REPEATED_SQL = int(os.getenv('METRICS_REPEATED_SQL', 10))
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_SLOW_SECONDS = float(os.getenv('PROFILE_SLOW_SECONDS', 1))
+    PROFILE_DIR = os.getenv('PROFILE_DIR')
+
+    # Response compression (compression.py)
+    COMPRESS_ENABLED = env_bool('COMPRESS_ENABLED', True)
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_STREAM_FLUSH = int(os.getenv('COMPRESS_STREAM_FLUSH', 64 * 1024))
+
+    # Purchase intake queue (intake_worker.py): worker threads per server process (main.start_workers)
+    INTAKE_WORKERS = int(os.getenv('INTAKE_WORKERS', 0))
+    INTAKE_BATCH = int(os.getenv('INTAKE_BATCH', 200))
+    INTAKE_POLL_INTERVAL = float(os.getenv('INTAKE_POLL_INTERVAL', 0.5))
+    INTAKE_RETENTION = int(os.getenv('INTAKE_RETENTION', 7 * 24 * 3600))
+
+    # Change feed (changes_app.py): longest ?wait= of GET /changes, and how often a
+    # waiting request polls for changes committed by other processes
+    CHANGES_MAX_WAIT = float(os.getenv('CHANGES_MAX_WAIT', 25))
+    CHANGES_POLL_INTERVAL = float(os.getenv('CHANGES_POLL_INTERVAL', 1))
+    CHANGES_RETENTION = int(os.getenv('CHANGES_RETENTION', 7 * 24 * 3600))
+
+    # Analytics exports (export_worker.py): where the files go, worker threads per server
+    # process (main.start_workers) and rows fetched per round trip of the server-side cursor
+    EXPORT_DIR = os.getenv('EXPORT_DIR') or os.path.join(tempfile.gettempdir(), 'exports')
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 0))
+    EXPORT_BATCH = int(os.getenv('EXPORT_BATCH', 5000))
+    EXPORT_POLL_INTERVAL = float(os.getenv('EXPORT_POLL_INTERVAL', 2))
+    # Longest an export may run; a "running" job older than that is retried, EXPORT_MAX_ATTEMPTS times at most
+    EXPORT_TIMEOUT = int(os.getenv('EXPORT_TIMEOUT', 3600))
+    EXPORT_MAX_ATTEMPTS = int(os.getenv('EXPORT_MAX_ATTEMPTS', 3))
@@ -0,0 +1,71 @@
+# Header
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+"""
+QueuePool that also measures how long requests wait for a connection.
+Statistics are exposed by GET /internal/pool (internal_app.py).
+"""
+
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self.wait_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self.wait_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def recreate(self):
+        # pool_pre_ping and invalidation rebuild the pool; keep the counters
+        new_pool = super().recreate()
+        new_pool.checkouts = self.checkouts
+        new_pool.wait_total = self.wait_total
+        new_pool.wait_max = self.wait_max
+        new_pool.timeouts = self.timeouts
+        return new_pool
+
+
+def exhausted(engine):
+    """True when every connection is checked out and the pool cannot grow."""
+    pool = engine.pool
+    return isinstance(pool, QueuePool) and pool.checkedin() == 0 and pool.overflow() >= pool._max_overflow
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool.wait_lock:
+            stats.update({
+                "checkouts": pool.checkouts,
+                "checkout_timeouts": pool.timeouts,
+                "wait_avg_ms": round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                "wait_max_ms": round(pool.wait_max * 1000, 3),
+            })
+    return stats
@@ -1,8 +1,14 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import invalidate
+from pagination import paginate
+from conditional import conditional
+from expand import ExpandError, expand
 from marshmallow import Schema, fields
 from sqlalchemy import Column, Integer, String, Date
+from sqlalchemy.orm import relationship
+from changes import log_cascade
 
 event_bp = Blueprint('event_bp', __name__)
 
@@ -13,6 +19,8 @@ class Event(db.Model):
     ev_name = Column(String(100), nullable=False)
     ev_description = Column(String(200), nullable=False)
     ev_date = Column(Date, nullable=False, unique=True)
+    venues = relationship('Venue', secondary='event_venue', viewonly=True, order_by='Venue.vn_id')
+    staff_assignments = relationship('StaffVenue', viewonly=True, order_by='StaffVenue.sv_id')
 
 # Marshmallow Schema
 class EventSchema(Schema):
@@ -20,33 +28,50 @@ class EventSchema(Schema):
     ev_name = fields.Str(required=True)
     ev_description = fields.Str(required=True)
     ev_date = fields.Date(required=True)
+    venues = fields.Nested('VenueSchema', many=True, exclude=('events',), dump_only=True)
+    staff = fields.Nested('StaffVenueSchema', many=True, exclude=('ev_id', 'event', 'venue'),
+                          attribute='staff_assignments', dump_only=True)
 
-event_schema = EventSchema()
-events_schema = EventSchema(many=True)
+# ?expand= name -> (schema field, relationship path)
+EVENT_EXPAND = {
+    'venues': ('venues', 'venues'),
+    'staff': ('staff', 'staff_assignments.staff'),
+    'supplier': ('staff.staff.supplier', 'staff_assignments.staff.supplier'),
+}
+EVENT_RELATED = ('event_venue', 'venue', 'staff_venue', 'staff', 'supplier')
+
+event_schema = EventSchema(exclude=('venues', 'staff'))
+events_schema = EventSchema(many=True, exclude=('venues', 'staff'))
 
 #Endpoints (CRUD)
 """
 -> GET all events
 curl http://localhost:5000/events
+curl "http://localhost:5000/events?expand=venues,staff,supplier"
 """
 @event_bp.route('/events', methods=['GET'])
+@conditional('event', expanded=EVENT_RELATED)
 def get_events():
-    all_events = Event.query.all()
-    if not all_events:
-        return jsonify({"Error": "No Events found"}), 404
-    return jsonify(events_schema.dump(all_events)), 200
+    return paginate(Event.query, events_schema, "No Events found",
+                    filters=('ev_date',), sorts=('ev_date',), expand=EVENT_EXPAND)
 
 
 """
 -> GET one event by ID
 curl http://localhost:5000/events/<event_id>
+curl "http://localhost:5000/events/<event_id>?expand=venues,staff,supplier"
 """
 @event_bp.route('/events/<int:ev_id>', methods=['GET'])
+@conditional('event', expanded=EVENT_RELATED)
 def get_event(ev_id):
-    event = Event.query.get(ev_id)
+    try:
+        query, _, hidden = expand(Event.query, EVENT_EXPAND)
+    except ExpandError as e:
+        return jsonify({"Error": str(e)}), 400
+    event = query.filter_by(ev_id=ev_id).first()
     if not event:
         return jsonify({"Error": "Event not found"}), 404
-    return jsonify(event_schema.dump(event)), 200
+    return jsonify(EventSchema(exclude=hidden).dump(event)), 200
 
 
 
@@ -105,6 +130,7 @@ def update_event(ev_id):
             return jsonify({"Error": "Event date already exists"}), 409
 
     db.session.commit()
+    invalidate(Event, ev_id)
     return jsonify(event_schema.dump(event)), 200
 
 """
@@ -116,6 +142,8 @@ def delete_event(ev_id):
     event = Event.query.get(ev_id)
     if not event:
         return jsonify({"Error": "Event not found"}), 404
+    log_cascade(Event, ev_id)
     db.session.delete(event)
     db.session.commit()
+    invalidate(Event, ev_id)
     return jsonify({"message": "Event deleted"}), 200
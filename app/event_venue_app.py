@@ -1,8 +1,13 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import exists, recheck
+from pagination import paginate
+from conditional import conditional
 from marshmallow import Schema, fields
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship
 from event_app import Event
 from venue_app import Venue
 
@@ -14,40 +19,52 @@ class EventVenue(db.Model):
     ev_ven_id = Column(Integer, primary_key=True)
     ev_id = Column(Integer, ForeignKey('event.ev_id', ondelete='CASCADE'), nullable=False)
     vn_id = Column(Integer, ForeignKey('venue.vn_id', ondelete='CASCADE'), nullable=False)
+    event = relationship(Event, viewonly=True)
+    venue = relationship(Venue, viewonly=True)
+
+    __table_args__ = (
+        UniqueConstraint('ev_id', 'vn_id', name='unique_event_venue'),
+    )
 
 # Marshmallow Schema
 class EventVenueSchema(Schema):
     ev_ven_id = fields.Int(dump_only=True)
     ev_id = fields.Int(required=True)
     vn_id = fields.Int(required=True)
+    event = fields.Nested('EventSchema', exclude=('venues', 'staff'), dump_only=True)
+    venue = fields.Nested('VenueSchema', exclude=('events',), dump_only=True)
 
-event_venue_schema = EventVenueSchema()
-event_venues_schema = EventVenueSchema(many=True)
+# ?expand= name -> (schema field, relationship path)
+EVENT_VENUE_EXPAND = {'event': ('event', 'event'), 'venue': ('venue', 'venue')}
+
+event_venue_schema = EventVenueSchema(exclude=('event', 'venue'))
+event_venues_schema = EventVenueSchema(many=True, exclude=('event', 'venue'))
 
 
 #Endpoints (CRUD)
 """
 -> GET all event_venue relations
 curl http://localhost:5000/event_venues
+curl "http://localhost:5000/event_venues?expand=event,venue"
 """
 @event_venue_bp.route('/event_venues', methods=['GET'])
+@conditional('event_venue', expanded=('event', 'venue'))
 def get_event_venues():
-    all_entries = EventVenue.query.all()
-    if not all_entries:
-        return jsonify({"Error": "Venues assign to Events not found"}), 404
-    return jsonify(event_venues_schema.dump(all_entries)), 200
+    return paginate(EventVenue.query, event_venues_schema, "Venues assign to Events not found",
+                    filters=('ev_id', 'vn_id'), expand=EVENT_VENUE_EXPAND)
 
 
 """
 -> GET all the venues assigined to an event
 curl http://localhost:5000/event_venues/<event_id>
+curl "http://localhost:5000/event_venues/<event_id>?expand=venue"
 """
 @event_venue_bp.route('/event_venues/<int:ev_id>', methods=['GET'])
+@conditional('event_venue', expanded=('event', 'venue'))
 def get_venues_by_event(ev_id):
-    entries = EventVenue.query.filter_by(ev_id=ev_id).all()
-    if not entries:
-        return jsonify({"Error": "Venues assign to Events not found"}), 404
-    return jsonify(event_venues_schema.dump(entries)), 200
+    entries = EventVenue.query.filter_by(ev_id=ev_id)
+    return paginate(entries, event_venues_schema, "Venues assign to Events not found",
+                    expand=EVENT_VENUE_EXPAND)
 
 
 """
@@ -67,9 +84,9 @@ def add_event_venue():
     if existing:
         return jsonify({'Error': 'This event already has this venue assigned'}), 409
 
-    if not Event.query.get(data['ev_id']):
+    if not exists(Event, data['ev_id']):
         return jsonify({'Error': 'Event ID not found'}), 404
-    if not Venue.query.get(data['vn_id']):
+    if not exists(Venue, data['vn_id']):
         return jsonify({'Error': 'Venue ID not found'}), 404
 
     new_entry = EventVenue(
@@ -77,7 +94,16 @@ def add_event_venue():
         vn_id=data['vn_id']
     )
     db.session.add(new_entry)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # The event or venue was deleted after it was cached
+        missing = recheck((Event, data['ev_id'], 'Event ID not found'), (Venue, data['vn_id'], 'Venue ID not found'))
+        if missing:
+            return jsonify({'Error': missing}), 404
+        # Assigned by a concurrent request since the check above (unique_event_venue)
+        return jsonify({'Error': 'This event already has this venue assigned'}), 409
     return jsonify(event_venue_schema.dump(new_entry)), 201
 
 
@@ -96,16 +122,23 @@ def update_event_venue(ev_ven_id):
         return jsonify({"Error": "Venue assignment not found"}), 404
     
     if 'ev_id' in data:
-        if not Event.query.get(data['ev_id']):
+        if not exists(Event, data['ev_id']):
             return jsonify({'Error': 'Event ID not found'}), 404
         entry.ev_id = data['ev_id']
 
     if 'vn_id' in data:
-        if not Venue.query.get(data['vn_id']):
+        if not exists(Venue, data['vn_id']):
             return jsonify({'Error': 'Venue ID not found'}), 404
         entry.vn_id = data['vn_id']
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        missing = recheck((Event, data.get('ev_id'), 'Event ID not found'), (Venue, data.get('vn_id'), 'Venue ID not found'))
+        if missing:
+            return jsonify({'Error': missing}), 404
+        return jsonify({'Error': 'This event already has this venue assigned'}), 409
     return jsonify(event_venue_schema.dump(entry)), 200
 
 
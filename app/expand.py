@@ -0,0 +1,62 @@
+# Header
+from flask import request
+from sqlalchemy.orm import selectinload, joinedload
+
+"""
+Nested views: ?expand= embeds related rows in the response instead of making
+the client call one endpoint per foreign key.
+
+curl "http://localhost:5000/events?expand=venues,staff,supplier"
+curl "http://localhost:5000/events/<event_id>?expand=venues"
+
+Each endpoint maps the names it can expand to (schema field, relationship
+path), e.g. 'supplier': ('staff.staff.supplier', 'staff_assignments.staff.supplier').
+Collections along the path are loaded with selectinload (one extra
+"WHERE fk IN (...)" query per level) and single rows with joinedload, so a
+page costs a fixed number of queries however many rows it has. Fields that
+are not expanded are left out of the schema and never touched, so they do
+not lazy load either. Expanding a nested field also shows its parents.
+"""
+
+
+class ExpandError(ValueError):
+    pass
+
+
+def loader(entity, path):
+    option = None
+    for name in path.split('.'):
+        attr = getattr(entity, name)
+        many = attr.property.uselist
+        if option is None:
+            option = selectinload(attr) if many else joinedload(attr)
+        else:
+            option = option.selectinload(attr) if many else option.joinedload(attr)
+        entity = attr.property.mapper.class_
+    return option
+
+
+def parse_expand(expandable):
+    value = request.args.get('expand')
+    if not value:
+        return []
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in expandable]
+    if unknown:
+        raise ExpandError(f"Cannot expand: {', '.join(unknown)}")
+    return names
+
+
+def expand(query, expandable):
+    """Return (query, shown, hidden): the query with loaders for ?expand, and the schema fields to show/leave out."""
+    names = parse_expand(expandable)
+    shown = {expandable[name][0] for name in names}
+    hidden = {
+        field for field, _ in expandable.values()
+        if field not in shown and not any(other.startswith(field + '.') for other in shown)
+    }
+    if names:
+        entity = query.column_descriptions[0]['entity']
+        query = query.options(*[loader(entity, expandable[name][1]) for name in names])
+    return query, shown, hidden
+
@@ -0,0 +1,279 @@
+# Header
+import csv
+import datetime
+import gzip
+import json
+import os
+import random
+import time
+from flask import current_app
+from use_db import db
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Enum, Index, select, or_, and_
+from routing import replica_binds
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+"""
+Export jobs for analytics: joined purchase, attendee, ticket and event rows
+(or the attendee list) written to EXPORT_DIR as gzip CSV, or Parquet when
+pyarrow is installed.
+
+Jobs are queued by POST /exports (export_app.py) or run at once by
+"flask export run"; export_worker.py runs the queued ones. Rows are read
+through a server-side cursor (PyMySQL SSCursor) EXPORT_BATCH at a time from a
+read replica when there is one, so neither the worker's memory nor the
+primary grows with the table. The file is written as <name>.<attempt>.part
+and renamed when complete. The session gives its connection back while a
+job runs, so a worker thread needs one connection at a time on each engine.
+
+A job fails when it runs longer than EXPORT_TIMEOUT. A job still "running"
+EXPORT_TIMEOUT + STALE_GRACE seconds after it started belongs to a worker
+that died, and the next claim() takes it over, up to EXPORT_MAX_ATTEMPTS
+times. finish() only records the claim that is still current, so a worker
+that was merely slow cannot overwrite the outcome or the file of the one that
+took over.
+"""
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FORMATS = ('csv', 'parquet') if pyarrow is not None else ('csv',)
+EXTENSIONS = {'csv': 'csv.gz', 'parquet': 'parquet'}
+STALE_GRACE = 60
+MIMETYPES = {'csv': 'application/gzip', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# SQLAlchemy Model
+class ExportJob(db.Model):
+    __tablename__ = 'export_job'
+    job_id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)
+    format = Column(Enum('csv', 'parquet'), nullable=False)
+    params = Column(Text, nullable=False)
+    status = Column(Enum(QUEUED, RUNNING, DONE, FAILED), nullable=False, default=QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    rows = Column(BigInteger().with_variant(Integer, 'sqlite'))
+    file = Column(String(255))
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('idx_export_status', 'status', 'job_id'),
+    )
+
+
+def purchases_query(params):
+    tables = db.metadata.tables
+    purchase, attendee, ticket, event = tables['purchase'], tables['attendee'], tables['ticket'], tables['event']
+    stmt = (
+        select(
+            purchase.c.att_id, purchase.c.tic_id, purchase.c.purchase_date, purchase.c.purchase_type,
+            attendee.c.att_name, attendee.c.att_last_name, attendee.c.att_email,
+            ticket.c.tic_type, ticket.c.tic_status_id,
+            event.c.ev_id, event.c.ev_name, event.c.ev_date,
+        )
+        .select_from(
+            purchase
+            .join(attendee, attendee.c.att_id == purchase.c.att_id)
+            .join(ticket, ticket.c.tic_id == purchase.c.tic_id)
+            .join(event, event.c.ev_id == ticket.c.ev_id)
+        )
+    )
+    if params.get('ev_id') is not None:
+        stmt = stmt.where(ticket.c.ev_id == params['ev_id'])
+    if params.get('from'):
+        stmt = stmt.where(purchase.c.purchase_date >= datetime.date.fromisoformat(params['from']))
+    if params.get('to'):
+        stmt = stmt.where(purchase.c.purchase_date <= datetime.date.fromisoformat(params['to']))
+    return stmt
+
+
+def attendees_query(params):
+    return select(db.metadata.tables['attendee'])
+
+
+# Export kind -> query builder; no ORDER BY, so the database streams rows as it reads them
+KINDS = {'purchases': purchases_query, 'attendees': attendees_query}
+
+
+def enqueue(kind, fmt, params, status=QUEUED):
+    """Add a job; status=RUNNING for one the caller runs itself."""
+    now = utcnow()
+    job = ExportJob(kind=kind, format=fmt, params=json.dumps(params), status=status, created_at=now,
+                    started_at=now if status == RUNNING else None, attempts=1 if status == RUNNING else 0)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claimed(job):
+    """What run() and finish() need of a job, copied so the session can give its connection back."""
+    return {'job_id': job.job_id, 'kind': job.kind, 'format': job.format,
+            'params': json.loads(job.params), 'attempts': job.attempts}
+
+
+def claim(timeout, max_attempts):
+    """Take the oldest queued or abandoned job; other workers skip it (MySQL 8 SKIP LOCKED).
+
+    Returns claimed(job), read before the commit: touching the job afterwards
+    would reload it and keep a connection for the whole export.
+    """
+    while True:
+        now = utcnow()
+        stale = now - datetime.timedelta(seconds=timeout + STALE_GRACE)
+        job = (
+            ExportJob.query
+            .filter(or_(ExportJob.status == QUEUED,
+                        and_(ExportJob.status == RUNNING, ExportJob.started_at < stale)))
+            .order_by(ExportJob.job_id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.session.rollback()
+            return None
+        if job.attempts >= max_attempts:
+            # Its workers kept dying (out of memory...): stop retrying it
+            job.status = FAILED
+            job.error = f"Export worker stopped during each of {job.attempts} attempts"
+            job.finished_at = now
+            db.session.commit()
+            continue
+        job.status = RUNNING
+        job.started_at = now
+        job.attempts += 1
+        fields = claimed(job)
+        db.session.commit()
+        return fields
+
+
+def arrow_type(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return pyarrow.string()
+    if python_type is int:
+        return pyarrow.int64()
+    if python_type is datetime.date:
+        return pyarrow.date32()
+    if python_type is datetime.datetime:
+        return pyarrow.timestamp('us')
+    return pyarrow.string()
+
+
+def write_csv(path, columns, chunks):
+    count = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([column.name for column in columns])
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def write_parquet(path, columns, chunks):
+    # One row group per chunk, columns typed from the query so empty chunks agree
+    schema = pyarrow.schema([(column.name, arrow_type(column)) for column in columns])
+    count = 0
+    with parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+        for rows in chunks:
+            arrays = [list(values) for values in zip(*rows)]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+
+WRITERS = {'csv': write_csv, 'parquet': write_parquet}
+
+
+def until(chunks, timeout):
+    # Stop before another worker may take the job over
+    deadline = time.monotonic() + timeout
+    for rows in chunks:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Export took longer than EXPORT_TIMEOUT ({timeout} seconds)")
+        yield rows
+
+
+def file_name(job):
+    return f"{job['kind']}-{job['job_id']}.{EXTENSIONS[job['format']]}"
+
+
+def part_path(directory, job):
+    # One per attempt: a worker that was only slow and the one that took the job over never share it
+    return os.path.join(directory, f"{file_name(job)}.{job['attempts']}.part")
+
+
+def run(job, directory, batch, timeout):
+    """Write the file of a claimed job to its part_path(); returns the rows written."""
+    stmt = KINDS[job['kind']](job['params'])
+    replicas = replica_binds(current_app.config)
+    engine = db.engines[random.choice(replicas)] if replicas else db.engine
+    os.makedirs(directory, exist_ok=True)
+    part = part_path(directory, job)
+    try:
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=batch).execute(stmt)
+            return WRITERS[job['format']](part, list(stmt.selected_columns), until(result.partitions(), timeout))
+    except Exception:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+def finish(job, directory, count=None, error=None):
+    """Record how a claimed job ended, renaming its file into place when it succeeded.
+
+    Returns False, and drops the file, when the claim is no longer current:
+    the job was taken over by another worker (attempts moved on) or ended.
+    """
+    part = part_path(directory, job)
+    row = (
+        ExportJob.query
+        .filter_by(job_id=job['job_id'], attempts=job['attempts'], status=RUNNING)
+        .with_for_update()
+        .first()
+    )
+    if row is None:
+        db.session.rollback()
+        if os.path.exists(part):
+            os.remove(part)
+        return False
+    name = None
+    if error is None:
+        # Under the row lock: the worker that took the job over cannot finish in between
+        name = file_name(job)
+        os.replace(part, os.path.join(directory, name))
+    row.status = FAILED if error else DONE
+    row.file = name
+    row.rows = count
+    row.error = error
+    row.finished_at = utcnow()
+    db.session.commit()
+    return True
+
+
+def describe(job):
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "format": job.format,
+        "params": json.loads(job.params),
+        "status": job.status,
+        "attempts": job.attempts,
+        "rows": job.rows,
+        "file": job.file,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,79 @@
+# Header
+import os
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from use_db import db
+from routing import use_primary
+from marshmallow import Schema, fields, validate
+from export import ExportJob, KINDS, FORMATS, MIMETYPES, DONE, enqueue, describe
+
+export_bp = Blueprint('export_bp', __name__)
+
+# Marshmallow Schema
+class ExportSchema(Schema):
+    kind = fields.Str(required=True, validate=validate.OneOf(sorted(KINDS)))
+    format = fields.Str(load_default='csv', validate=validate.OneOf(FORMATS))
+    ev_id = fields.Int(load_default=None)
+    date_from = fields.Date(data_key='from', load_default=None)
+    date_to = fields.Date(data_key='to', load_default=None)
+
+export_schema = ExportSchema()
+
+
+# Endpoints
+"""
+-> POST queue an export for analytics: 202 with a status URL; the export workers (export_worker.py) write the file
+kind: "purchases" (purchase + attendee + ticket + event rows) or "attendees"; format: "csv" (gzip) or "parquet" (when
+pyarrow is installed); purchases only: ev_id, from, to (purchase_date range)
+curl -X POST http://localhost:5000/exports \
+    -H "Content-Type: application/json" \
+    -d '{"kind": "purchases", "format": "csv", "from": "2024-01-01"}'
+"""
+@export_bp.route('/exports', methods=['POST'])
+def add_export():
+    data = request.json
+    errors = export_schema.validate(data)
+    if errors:
+        return jsonify({"Error": "Invalid data", "details": errors}), 400
+
+    options = export_schema.load(data)
+    params = {
+        'ev_id': options['ev_id'],
+        'from': options['date_from'].isoformat() if options['date_from'] else None,
+        'to': options['date_to'].isoformat() if options['date_to'] else None,
+    }
+    job = enqueue(options['kind'], options['format'], params)
+    status_url = f"/exports/{job.job_id}"
+    response = jsonify({"job_id": job.job_id, "status": job.status, "status_url": status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+
+"""
+-> GET status of an export (read from the primary, a replica may not have the worker's update yet): "queued", "running", then "done" (file and rows set) or "failed" (error set)
+curl http://localhost:5000/exports/<job_id>
+"""
+@export_bp.route('/exports/<int:job_id>', methods=['GET'])
+@use_primary
+def get_export(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({"Error": "Export not found"}), 404
+    return jsonify(describe(job)), 200
+
+
+"""
+-> GET the file of a finished export, when EXPORT_DIR is mounted on this pod
+curl -o purchases.csv.gz http://localhost:5000/exports/<job_id>/file
+"""
+@export_bp.route('/exports/<int:job_id>/file', methods=['GET'])
+@use_primary
+def get_export_file(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({"Error": "Export not found"}), 404
+    if job.status != DONE:
+        return jsonify({"Error": f"Export is {job.status}"}), 409
+    directory = current_app.config['EXPORT_DIR']
+    if not os.path.isfile(os.path.join(directory, job.file)):
+        return jsonify({"Error": "Export file is not on this server's EXPORT_DIR"}), 404
+    return send_from_directory(directory, job.file, mimetype=MIMETYPES[job.format], as_attachment=True)
@@ -0,0 +1,105 @@
+# Header
+import json
+import threading
+import time
+import click
+from use_db import db
+from export import ExportJob, KINDS, FORMATS, RUNNING, claimed, claim, enqueue, run, finish, describe
+
+"""
+Runs the export jobs of export.py.
+
+EXPORT_WORKERS threads per server process (0 = none, the default for the
+API pods; started by gunicorn_conf.py and main.py, never by create_app()) each
+run one queued job at a time and check the queue every EXPORT_POLL_INTERVAL
+seconds. Exports are meant for a process of their own,
+e.g. the flask-export-worker Deployment:
+cd app && flask --app "main:create_app()" export worker
+
+Or run one export at once, without the queue:
+cd app && flask --app "main:create_app()" export run purchases --format csv --from 2024-01-01
+
+A worker that dies mid-export leaves its job "running": once EXPORT_TIMEOUT
+(plus a minute) has passed since it started, another worker takes it over.
+
+Each thread holds at most one connection of the primary's pool and one of the
+replica's (the primary's when there is no replica): with
+DB_POOL_SIZE + DB_MAX_OVERFLOW >= 2 x threads no thread ever waits for one.
+"""
+
+
+def run_job(app, job):
+    """Run a job from claim(); the session holds no connection while the file is written."""
+    config = app.config
+    db.session.close()
+    try:
+        count = run(job, config['EXPORT_DIR'], config['EXPORT_BATCH'], config['EXPORT_TIMEOUT'])
+    except Exception as e:
+        app.logger.exception("Export job %s failed", job['job_id'])
+        finish(job, config['EXPORT_DIR'], error=f"{type(e).__name__}: {e}")
+        return
+    if not finish(job, config['EXPORT_DIR'], count):
+        app.logger.warning("Export job %s was taken over by another worker, attempt %s dropped",
+                           job['job_id'], job['attempts'])
+
+
+def work(app, stop):
+    with app.app_context():
+        while not stop.is_set():
+            job = None
+            try:
+                job = claim(app.config['EXPORT_TIMEOUT'], app.config['EXPORT_MAX_ATTEMPTS'])
+                if job is not None:
+                    run_job(app, job)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Export worker failed")
+            finally:
+                db.session.remove()
+            if job is None:
+                stop.wait(app.config['EXPORT_POLL_INTERVAL'])
+
+
+def start_workers(app, count):
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=work, args=(app, stop), name=f"export-worker-{i}", daemon=True)
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return stop, threads
+
+
+def init_app(app):
+    @app.cli.group('export')
+    def export_cli():
+        """Analytics exports."""
+
+    @export_cli.command('worker')
+    @click.option('--threads', default=1, show_default=True, help="Worker threads")
+    def export_worker(threads):
+        """Run queued export jobs until interrupted."""
+        stop, workers = start_workers(app, threads)
+        try:
+            while any(thread.is_alive() for thread in workers):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stop.set()
+
+    @export_cli.command('run')
+    @click.argument('kind', type=click.Choice(sorted(KINDS)))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+    @click.option('--ev-id', type=int, help="purchases: only this event")
+    @click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), help="purchases: purchase_date from")
+    @click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), help="purchases: purchase_date to")
+    def export_run(kind, fmt, ev_id, date_from, date_to):
+        """Export KIND to EXPORT_DIR now."""
+        params = {
+            'ev_id': ev_id,
+            'from': date_from.date().isoformat() if date_from else None,
+            'to': date_to.date().isoformat() if date_to else None,
+        }
+        job = claimed(enqueue(kind, fmt, params, status=RUNNING))
+        run_job(app, job)
+        click.echo(json.dumps(describe(db.session.get(ExportJob, job['job_id']))))
@@ -0,0 +1,47 @@
+# Header
+import multiprocessing
+import os
+
+"""
+Gunicorn settings for the production server, all driven by environment variables
+(see flask-deployment.yml).
+gunicorn -c app/gunicorn_conf.py "main:create_app()"
+
+GUNICORN_WORKER_CLASS=gthread (default) serves GUNICORN_THREADS requests per worker with
+plain threads; "gevent" needs the gevent package installed and uses GUNICORN_WORKER_CONNECTIONS.
+"""
+
+# Load the application from this directory
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+backlog = int(os.getenv('GUNICORN_BACKLOG', 2048))
+
+# Timeouts (seconds)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Idle keep-alive connections wait in the gthread poller, not in a worker thread,
+# so clients paging through collections can keep reusing one connection
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers to bound memory growth; the jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Every worker builds its own app, so no database connection is shared across a fork
+preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    # The intake and export threads (INTAKE_WORKERS, EXPORT_WORKERS) run in the web
+    # workers, once each has built its app; create_app() alone never starts them
+    from main import start_workers
+    start_workers(worker.wsgi)
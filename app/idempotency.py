@@ -0,0 +1,188 @@
+# Header
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from flask import request, g, jsonify, current_app
+from use_db import db
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index, insert, select, update, delete
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import IntegrityError
+
+"""
+Idempotency-Key support for every POST and PUT handler.
+
+curl -X POST http://localhost:5000/purchases \
+    -H "Content-Type: application/json" \
+    -H "Idempotency-Key: <unique key, e.g. a UUID>" \
+    -d '{...}'
+
+The first request with a key runs normally and its response (2xx/4xx) is
+kept for IDEMPOTENCY_TTL seconds. A retry with the same key, method, path
+and body gets the stored response back, marked "Idempotent-Replayed: true",
+without running the handler. The same key with a different request is
+rejected with 422; a retry that arrives while the first request is still
+running gets 409. 5xx responses are not kept, so those retries run again.
+
+Keys live in the idempotency_key table on the primary, so a retry gets the
+same answer whichever worker or pod it lands on. A key is claimed with an
+INSERT (the primary key makes the second one fail); key rows are written on
+a connection of their own, outside the handler's transaction. Expired keys
+are deleted every PURGE_EVERY seconds.
+"""
+
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))
+# How long a request may hold its key before a retry can take it over
+IDEMPOTENCY_LOCK_TTL = int(os.getenv('IDEMPOTENCY_LOCK_TTL', 60))
+MAX_KEY_LENGTH = 255
+METHODS = ('POST', 'PUT')
+REPLAYED_HEADERS = ('Content-Type', 'Location', 'Link')
+PURGE_EVERY = 600
+
+purge_lock = threading.Lock()
+purged = time.monotonic()
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# SQLAlchemy Model
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+    idem_key = Column(String(MAX_KEY_LENGTH), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    # Set while the first request runs, NULL once its response is stored
+    owner = Column(String(32))
+    status = Column(Integer)
+    body = Column(Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'))
+    headers = Column(Text)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_idempotency_expires', 'expires_at'),
+    )
+
+
+def fingerprint():
+    digest = hashlib.sha256()
+    for part in (request.method, request.full_path, request.get_data(cache=True)):
+        digest.update(part if isinstance(part, bytes) else part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def replay(entry):
+    response = current_app.response_class(entry.body, status=entry.status)
+    for name, value in json.loads(entry.headers).items():
+        response.headers[name] = value
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(key, request_fingerprint, owner):
+    """Take the key for this request; returns None if it did, else the stored row."""
+    now = utcnow()
+    expires_at = now + datetime.timedelta(seconds=IDEMPOTENCY_LOCK_TTL)
+    table = IdempotencyKey.__table__
+    while True:
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(table).values(
+                    idem_key=key, fingerprint=request_fingerprint, owner=owner, expires_at=expires_at))
+            return None
+        except IntegrityError:
+            pass
+        with db.engine.begin() as connection:
+            # Expired, or left behind by a request that never finished: take it over
+            result = connection.execute(
+                update(table)
+                .where(table.c.idem_key == key, table.c.expires_at <= now)
+                .values(fingerprint=request_fingerprint, owner=owner, status=None, body=None, headers=None,
+                        expires_at=expires_at)
+            )
+            if result.rowcount == 1:
+                return None
+            entry = connection.execute(select(table).where(table.c.idem_key == key)).first()
+        if entry is not None:
+            return entry
+        # The first request gave the key up in between: claim it again
+
+
+def purge_expired():
+    global purged
+    if time.monotonic() - purged < PURGE_EVERY or not purge_lock.acquire(blocking=False):
+        return
+    try:
+        purged = time.monotonic()
+        with db.engine.begin() as connection:
+            connection.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= utcnow()))
+    finally:
+        purge_lock.release()
+
+
+def check_key():
+    key = request.headers.get('Idempotency-Key')
+    if request.method not in METHODS or key is None:
+        return None
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return jsonify({"Error": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}), 400
+
+    purge_expired()
+    request_fingerprint = fingerprint()
+    owner = uuid.uuid4().hex
+    entry = claim(key, request_fingerprint, owner)
+    if entry is None:
+        # First request with this key: run it, after_request keeps the response
+        g.idempotency_key = (key, owner)
+        return None
+
+    if entry.fingerprint != request_fingerprint:
+        return jsonify({"Error": "Idempotency-Key was already used for a different request"}), 422
+    if entry.owner is not None:
+        return jsonify({"Error": "A request with this Idempotency-Key is still in progress"}), 409
+    return replay(entry)
+
+
+def forget(key, owner):
+    with db.engine.begin() as connection:
+        connection.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.idem_key == key, IdempotencyKey.owner == owner)
+        )
+
+
+def save_response(response):
+    claimed = g.pop('idempotency_key', None)
+    if claimed is None:
+        return response
+    key, owner = claimed
+    if response.status_code >= 500 or response.is_streamed:
+        forget(key, owner)
+        return response
+    headers = {name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.idem_key == key, IdempotencyKey.owner == owner)
+            .values(owner=None, status=response.status_code, body=response.get_data(as_text=True),
+                    headers=json.dumps(headers),
+                    expires_at=utcnow() + datetime.timedelta(seconds=IDEMPOTENCY_TTL))
+        )
+    return response
+
+
+def release_key(error):
+    # after_request is skipped when the handler raises: let the retry run
+    claimed = g.pop('idempotency_key', None)
+    if claimed is not None:
+        forget(*claimed)
+
+
+def init_app(app):
+    # Registered after compression, so save_response sees the uncompressed body
+    app.before_request(check_key)
+    app.after_request(save_response)
+    app.teardown_request(release_key)
@@ -0,0 +1,247 @@
+# Header
+import csv
+import datetime
+import gzip
+import importlib
+import json
+import os
+import time
+import click
+from marshmallow import ValidationError
+from use_db import db
+from sqlalchemy import Column, String, BigInteger, Integer, DateTime, insert
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from changes import log_changes, inserted_ids
+
+"""
+Bulk import of CSV or NDJSON files (optionally .gz) into any entity:
+
+cd app
+flask --app "main:create_app()" import attendee attendees.csv
+flask --app "main:create_app()" import purchase purchases.ndjson.gz --batch 2000
+
+Records are validated with the entity's Marshmallow schema, like the POST
+handlers, and inserted BATCH at a time with multi-row INSERTs. Purchases go
+through create_purchases() (purchase_app.py), so ticket inventory and the
+sales rollup stay in step. Every insert is in the change feed (changes.py).
+
+Each batch commits together with the import's checkpoint (import_checkpoint),
+so an interrupted import continues after the last committed record when the
+same command is run again; --restart starts over. Rejected records are
+written to <file>.rejected.ndjson with their record number and errors. A
+batch that hits a constraint (duplicate email, missing foreign key, CHECK,
+value too long...) is retried one record at a time, so only the offending
+records are rejected. Lost connections, deadlocks and lock wait timeouts stop
+the import instead: run it again to resume.
+"""
+
+# Entity -> "module:model:schema", the same schema the POST handler validates with
+IMPORTS = {
+    'attendee': 'attendee_app:Attendee:attendee_schema',
+    'event': 'event_app:Event:event_schema',
+    'venue': 'venue_app:Venue:venue_schema',
+    'event_venue': 'event_venue_app:EventVenue:event_venue_schema',
+    'supplier': 'supplier_app:Supplier:supplier_schema',
+    'staff': 'staff_app:Staff:staff_schema',
+    'staff_venue': 'staff_venue_app:StaffVenue:staff_venue_schema',
+    'ticket_status': 'ticket_status_app:TicketStatus:ticket_status_schema',
+    'ticket': 'ticket_app:Ticket:ticket_schema',
+    'purchase': 'purchase_app:Purchase:purchase_schema',
+}
+DEFAULT_BATCH = 1000
+# MySQL lock wait timeout and deadlock: the server's doing, not the record's
+TRANSIENT_ERRORS = {1205, 1213}
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# SQLAlchemy Model
+class ImportCheckpoint(db.Model):
+    __tablename__ = 'import_checkpoint'
+    source = Column(String(255), primary_key=True)
+    position = Column(BigInteger().with_variant(Integer, 'sqlite'), nullable=False, default=0)
+    inserted = Column(BigInteger().with_variant(Integer, 'sqlite'), nullable=False, default=0)
+    rejected = Column(BigInteger().with_variant(Integer, 'sqlite'), nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+
+
+class BatchConflict(Exception):
+    pass
+
+
+def rejectable(error):
+    """Whether error was caused by the records: constraints, and values the columns refuse
+    (CHECK constraints, too long, out of range), which PyMySQL raises as OperationalError or DataError."""
+    if isinstance(error, BatchConflict):
+        return True
+    if error.connection_invalidated:
+        return False
+    code = error.orig.args[0] if error.orig is not None and error.orig.args else None
+    return code not in TRANSIENT_ERRORS
+
+
+def rejection(number, error):
+    status = 409 if isinstance(error, (IntegrityError, BatchConflict)) else 400
+    return {"record": number, "status": status, "Error": str(getattr(error, 'orig', error))}
+
+
+def target(entity):
+    module, model, schema = IMPORTS[entity].split(':')
+    module = importlib.import_module(module)
+    return getattr(module, model), getattr(module, schema)
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    return open(path, newline='', encoding='utf-8')
+
+
+def file_format(path, name=None):
+    if name:
+        return name
+    base = path[:-3] if path.endswith('.gz') else path
+    if base.endswith('.csv'):
+        return 'csv'
+    if base.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise click.BadParameter(f"Cannot tell the format of {path}, pass --format", param_hint='FILE')
+
+
+def read_records(stream, fmt):
+    """Yield each record as a dict; empty CSV cells are left out, as if the field was not sent."""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {name: value for name, value in row.items() if value not in ('', None)}
+    else:
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Not JSON: the schema rejects it as invalid input
+                    yield line.strip()
+
+
+def batches(records, size, skip):
+    """(number of the first record, [records]) chunks, after skipping the first skip records."""
+    batch, start = [], skip + 1
+    for number, record in enumerate(records, 1):
+        if number <= skip:
+            continue
+        batch.append(record)
+        if len(batch) == size:
+            yield start, batch
+            batch, start = [], number + 1
+    if batch:
+        yield start, batch
+
+
+def primary_keys(model, rows, result):
+    columns = [column.key for column in model.__table__.primary_key.columns]
+    if all(column in rows[0] for column in columns):
+        return [tuple(row[column] for column in columns) for row in rows]
+    return inserted_ids(result, len(rows))
+
+
+def insert_rows(model, schema, records, first):
+    """Validate and insert records; returns (inserted, [rejected]). IntegrityError rolls the batch back."""
+    rows, rejected = [], []
+    for number, record in enumerate(records, first):
+        try:
+            rows.append(schema.load(record))
+        except ValidationError as e:
+            rejected.append({"record": number, "status": 400, "Error": "Invalid data", "details": e.messages})
+    if rows:
+        result = db.session.execute(insert(model).values(rows))
+        log_changes(model.__tablename__, primary_keys(model, rows, result), 'insert')
+    return len(rows), rejected
+
+
+def insert_purchases(model, schema, records, first):
+    create_purchases = importlib.import_module('purchase_app').create_purchases
+    results = create_purchases(records, commit=False)
+    if results is None:
+        raise BatchConflict("Purchases conflicted with a concurrent write")
+    rejected = [
+        {"record": number, **result}
+        for number, result in enumerate(results, first) if result['status'] != 201
+    ]
+    return len(records) - len(rejected), rejected
+
+
+def save_checkpoint(source, position, inserted, rejected, finished=False):
+    now = utcnow()
+    db.session.merge(ImportCheckpoint(
+        source=source, position=position, inserted=inserted, rejected=rejected,
+        updated_at=now, finished_at=now if finished else None,
+    ))
+
+
+def run_import(entity, path, fmt, batch_size, restart, echo):
+    model, schema = target(entity)
+    load = insert_purchases if entity == 'purchase' else insert_rows
+    source = f"{entity}:{os.path.abspath(path)}"[:255]
+
+    checkpoint = db.session.get(ImportCheckpoint, source)
+    if checkpoint and not restart:
+        if checkpoint.finished_at:
+            echo(f"{path} was imported on {checkpoint.finished_at:%Y-%m-%d %H:%M}, --restart imports it again")
+            return
+        position, inserted, rejected = checkpoint.position, checkpoint.inserted, checkpoint.rejected
+        echo(f"Resuming after record {position}")
+    else:
+        position, inserted, rejected = 0, 0, 0
+    db.session.rollback()
+
+    started = time.monotonic()
+    totals = {'position': position, 'inserted': inserted, 'rejected': rejected}
+    with open_text(path) as stream, open(f"{path}.rejected.ndjson", 'a' if position else 'w') as rejects:
+
+        def commit(last, added, failed):
+            save_checkpoint(source, last, totals['inserted'] + added, totals['rejected'] + len(failed))
+            db.session.commit()
+            totals.update(position=last, inserted=totals['inserted'] + added, rejected=totals['rejected'] + len(failed))
+            for failure in failed:
+                rejects.write(json.dumps(failure, default=str) + '\n')
+
+        for first, records in batches(read_records(stream, fmt), batch_size, position):
+            last = first + len(records) - 1
+            try:
+                commit(last, *load(model, schema, records, first))
+            except (DBAPIError, BatchConflict) as e:
+                db.session.rollback()
+                if not rejectable(e):
+                    raise
+                # A record broke a constraint: redo the batch one record at a time
+                for number, record in enumerate(records, first):
+                    try:
+                        commit(number, *load(model, schema, [record], number))
+                    except (DBAPIError, BatchConflict) as e:
+                        db.session.rollback()
+                        if not rejectable(e):
+                            raise
+                        commit(number, 0, [rejection(number, e)])
+            rate = (last - position) / max(time.monotonic() - started, 1e-9)
+            echo(f"{last} records read, {totals['inserted']} inserted, {totals['rejected']} rejected ({rate:.0f} records/s)")
+
+    position, inserted, rejected = totals['position'], totals['inserted'], totals['rejected']
+    save_checkpoint(source, position, inserted, rejected, finished=True)
+    db.session.commit()
+    echo(f"Done: {inserted} inserted, {rejected} rejected" + (f" (see {path}.rejected.ndjson)" if rejected else ""))
+
+
+def init_app(app):
+    @app.cli.command('import')
+    @click.argument('entity', type=click.Choice(sorted(IMPORTS)))
+    @click.argument('path', metavar='FILE', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help="Default: from the file extension")
+    @click.option('--batch', 'batch_size', default=DEFAULT_BATCH, show_default=True, type=click.IntRange(1, 50000))
+    @click.option('--restart', is_flag=True, help="Ignore the checkpoint of an earlier run")
+    def import_command(entity, path, fmt, batch_size, restart):
+        """Import a CSV or NDJSON file into ENTITY."""
+        run_import(entity, path, file_format(path, fmt), batch_size, restart,
+                   echo=lambda message: click.echo(message, err=True))
@@ -0,0 +1,83 @@
+# Header
+import datetime
+import json
+from use_db import db
+from sqlalchemy import Column, Integer, Enum, Text, DateTime, Index, delete
+
+"""
+Durable queue of purchases accepted with POST /purchases?async=1.
+
+The request only validates the payload and inserts a purchase_intake row
+(status "queued"); intake_worker.py drains the queue in batches through the
+same create_purchases() as POST /purchases/bulk and stores each item's
+result on its row, readable at GET /purchases/intake/<intake_id>.
+"""
+
+QUEUED, DONE, FAILED = 'queued', 'done', 'failed'
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# SQLAlchemy Model
+class PurchaseIntake(db.Model):
+    __tablename__ = 'purchase_intake'
+    intake_id = Column(Integer, primary_key=True)
+    payload = Column(Text, nullable=False)
+    status = Column(Enum(QUEUED, DONE, FAILED), nullable=False, default=QUEUED)
+    result = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    processed_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('idx_intake_status', 'status', 'intake_id'),
+    )
+
+
+def enqueue(item):
+    row = PurchaseIntake(payload=json.dumps(item), status=QUEUED, created_at=utcnow())
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+
+def claim(limit):
+    """Lock up to limit queued rows, oldest first; other workers skip them (MySQL 8 SKIP LOCKED)."""
+    return (
+        PurchaseIntake.query
+        .filter_by(status=QUEUED)
+        .order_by(PurchaseIntake.intake_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def finish(rows, results):
+    now = utcnow()
+    for row, result in zip(rows, results):
+        row.status = DONE if result['status'] == 201 else FAILED
+        row.result = json.dumps(result)
+        row.processed_at = now
+
+
+def purge(older_than):
+    """Delete processed rows older than older_than seconds."""
+    cutoff = utcnow() - datetime.timedelta(seconds=older_than)
+    db.session.execute(
+        delete(PurchaseIntake)
+        .where(PurchaseIntake.status != QUEUED)
+        .where(PurchaseIntake.processed_at < cutoff)
+    )
+    db.session.commit()
+
+
+def describe(row):
+    return {
+        "intake_id": row.intake_id,
+        "status": row.status,
+        "created_at": row.created_at.isoformat(),
+        "processed_at": row.processed_at.isoformat() if row.processed_at else None,
+        "result": json.loads(row.result) if row.result else None,
+    }
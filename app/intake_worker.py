@@ -0,0 +1,87 @@
+# Header
+import json
+import threading
+import time
+import click
+from use_db import db
+from intake import claim, finish, purge
+from purchase_app import create_purchases
+
+"""
+Background writer for the purchase intake queue (intake.py).
+
+INTAKE_WORKERS threads per server process (0 = none) each take up to
+INTAKE_BATCH queued purchases, insert them in one transaction together with
+the intake rows' results, and sleep INTAKE_POLL_INTERVAL seconds when the
+queue is empty. Claiming and processing share the transaction, so a worker
+that dies leaves its rows queued for the next one.
+
+The servers start them (gunicorn_conf.py, main.py), not create_app(): the
+"flask ..." commands, which build the app too, leave the queue alone.
+A dedicated process can drain the queue instead of the web workers:
+cd app && flask --app "main:create_app()" intake-worker --threads 4
+"""
+
+PURGE_EVERY = 600
+
+
+def drain(limit):
+    """Process up to limit queued purchases; None if a concurrent write conflicted."""
+    rows = claim(limit)
+    if not rows:
+        db.session.rollback()
+        return 0
+    results = create_purchases([json.loads(row.payload) for row in rows], commit=False)
+    if results is None:
+        # create_purchases rolled back: the rows are still queued
+        return None
+    finish(rows, results)
+    db.session.commit()
+    return len(rows)
+
+
+def work(app, stop):
+    config = app.config
+    limit = config['INTAKE_BATCH']
+    purged = time.monotonic()
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                processed = drain(limit)
+                if time.monotonic() - purged > PURGE_EVERY:
+                    purge(config['INTAKE_RETENTION'])
+                    purged = time.monotonic()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Purchase intake worker failed")
+                processed = 0
+            finally:
+                db.session.remove()
+            # After a conflict retry one purchase at a time, so only the conflicting one fails
+            limit = 1 if processed is None else config['INTAKE_BATCH']
+            if processed == 0:
+                stop.wait(config['INTAKE_POLL_INTERVAL'])
+
+
+def start_workers(app, count):
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=work, args=(app, stop), name=f"intake-worker-{i}", daemon=True)
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return stop, threads
+
+
+def init_app(app):
+    @app.cli.command('intake-worker')
+    @click.option('--threads', default=1, show_default=True, help="Worker threads")
+    def intake_worker(threads):
+        """Drain the purchase intake queue until interrupted."""
+        stop, workers = start_workers(app, threads)
+        try:
+            while any(thread.is_alive() for thread in workers):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stop.set()
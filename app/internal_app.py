@@ -0,0 +1,64 @@
+# Header
+from flask import Blueprint, jsonify, Response
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from use_db import db
+from db_pool import pool_stats, exhausted
+from metrics import registry
+
+internal_bp = Blueprint('internal_bp', __name__)
+
+# Endpoints
+"""
+-> GET liveness: the worker answers requests; never touches the database
+curl http://localhost:5000/healthz
+"""
+@internal_bp.route('/healthz', methods=['GET'])
+def get_health():
+    return jsonify({"status": "ok"}), 200
+
+
+"""
+-> GET readiness: 200 when the primary database answers, 503 otherwise (the pod leaves the Service)
+curl http://localhost:5000/readyz
+When every pooled connection is busy the check does not queue behind the requests
+holding them: connections in use mean the database answered moments ago.
+"""
+@internal_bp.route('/readyz', methods=['GET'])
+def get_ready():
+    engine = db.engine
+    if not exhausted(engine):
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except SQLAlchemyError as e:
+            return jsonify({"status": "unavailable", "Error": type(e).__name__}), 503
+    return jsonify({"status": "ready", "pool": pool_stats(engine)}), 200
+
+
+"""
+-> GET connection pool statistics of this worker (one entry per database bind)
+curl http://localhost:5000/internal/pool
+"""
+@internal_bp.route('/internal/pool', methods=['GET'])
+def get_pool_stats():
+    stats = {
+        bind or 'default': pool_stats(engine)
+        for bind, engine in db.engines.items()
+    }
+    return jsonify(stats), 200
+
+
+"""
+-> GET request, SQL and connection pool metrics of this worker in Prometheus text format
+curl http://localhost:5000/metrics
+"""
+@internal_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    lines = registry.render()
+    lines += ['# HELP app_db_pool Connection pool state and checkout statistics.', '# TYPE app_db_pool gauge']
+    for bind, engine in db.engines.items():
+        for name, value in pool_stats(engine).items():
+            if isinstance(value, (int, float)):
+                lines.append(f'app_db_pool{{bind="{bind or "default"}",stat="{name}"}} {value}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,152 @@
+# Header
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from use_db import db
+from sqlalchemy import Column, Integer, Enum, DateTime, ForeignKey, ForeignKeyConstraint, Index, update, delete
+
+"""
+Ticket inventory counters used to sell without overselling.
+
+There is one counter row per (event, ticket type). Every sale or hold takes
+seats with a conditional UPDATE ("available = available - n WHERE
+available >= n"), so the row lock is only held by buyers of the same event
+and ticket type, and only until their transaction commits. Events without
+counter rows are not capacity managed and sell as before.
+"""
+
+# SQLAlchemy Models
+class TicketInventory(db.Model):
+    __tablename__ = 'ticket_inventory'
+    ev_id = Column(Integer, ForeignKey('event.ev_id', ondelete='CASCADE'), primary_key=True)
+    tic_type = Column(Enum('VIP', 'General', 'Premium'), primary_key=True)
+    capacity = Column(Integer, nullable=False)
+    available = Column(Integer, nullable=False)
+
+
+class TicketHold(db.Model):
+    __tablename__ = 'ticket_hold'
+    hold_id = Column(Integer, primary_key=True)
+    ev_id = Column(Integer, nullable=False)
+    tic_type = Column(Enum('VIP', 'General', 'Premium'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['ev_id', 'tic_type'],
+            ['ticket_inventory.ev_id', 'ticket_inventory.tic_type'],
+            ondelete='CASCADE'
+        ),
+        Index('idx_hold_expires', 'expires_at'),
+    )
+
+
+class SoldOut(Exception):
+    pass
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def is_managed(ev_id, tic_type):
+    return db.session.get(TicketInventory, (ev_id, tic_type)) is not None
+
+
+def take(ev_id, tic_type, quantity):
+    result = db.session.execute(
+        update(TicketInventory)
+        .where(TicketInventory.ev_id == ev_id,
+               TicketInventory.tic_type == tic_type,
+               TicketInventory.available >= quantity)
+        .values(available=TicketInventory.available - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def reserve(ev_id, tic_type, quantity):
+    """Take seats from the counter; raise SoldOut if there are not enough."""
+    if take(ev_id, tic_type, quantity) or not is_managed(ev_id, tic_type):
+        return
+    # Seats of expired holds only come back when someone reclaims them: do it now and try again
+    if release_expired(ev_id) and take(ev_id, tic_type, quantity):
+        return
+    raise SoldOut(f"Not enough {tic_type} tickets left for event {ev_id}")
+
+
+def release(ev_id, tic_type, quantity):
+    db.session.execute(
+        update(TicketInventory)
+        .where(TicketInventory.ev_id == ev_id,
+               TicketInventory.tic_type == tic_type,
+               TicketInventory.available + quantity <= TicketInventory.capacity)
+        .values(available=TicketInventory.available + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_sold(sold):
+    """Give back the seats of sales deleted with their ticket or attendee; sold as returned by rollup.sales_of()."""
+    seats = Counter()
+    for key, count in sold.items():
+        seats[key[:2]] += count
+    for (ev_id, tic_type), count in seats.items():
+        release(ev_id, tic_type, count)
+
+
+def hold(ev_id, tic_type, quantity, ttl):
+    reserve(ev_id, tic_type, quantity)
+    new_hold = TicketHold(
+        ev_id=ev_id,
+        tic_type=tic_type,
+        quantity=quantity,
+        expires_at=utcnow() + timedelta(seconds=ttl)
+    )
+    db.session.add(new_hold)
+    return new_hold
+
+
+def consume_hold(hold_id, ev_id, tic_type):
+    """Turn one held seat into a sale; False if the hold is gone or expired."""
+    result = db.session.execute(
+        update(TicketHold)
+        .where(TicketHold.hold_id == hold_id,
+               TicketHold.ev_id == ev_id,
+               TicketHold.tic_type == tic_type,
+               TicketHold.quantity >= 1,
+               TicketHold.expires_at > utcnow())
+        .values(quantity=TicketHold.quantity - 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def drop_hold(hold_id):
+    """Delete a hold and give its seats back. Only one caller can win the delete."""
+    found = db.session.get(TicketHold, hold_id, with_for_update=True, populate_existing=True)
+    if not found:
+        return False
+    ev_id, tic_type, quantity = found.ev_id, found.tic_type, found.quantity
+    db.session.expunge(found)
+    result = db.session.execute(
+        delete(TicketHold)
+        .where(TicketHold.hold_id == hold_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    if quantity:
+        release(ev_id, tic_type, quantity)
+    return True
+
+
+def release_expired(ev_id=None, batch=500):
+    query = TicketHold.query.with_entities(TicketHold.hold_id).filter(TicketHold.expires_at <= utcnow())
+    if ev_id is not None:
+        query = query.filter(TicketHold.ev_id == ev_id)
+    released = 0
+    for (hold_id,) in query.limit(batch).all():
+        if drop_hold(hold_id):
+            released += 1
+    return released
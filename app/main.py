@@ -1,39 +1,114 @@
 # Header
+import importlib
 from flask import Flask
 from use_db import db
-from attendee_app import attendee_bp
-from event_app import event_bp
-from purchase_app import purchase_bp
-from staff_app import staff_bp
-from staff_venue_app import staff_venue_bp
-from supplier_app import supplier_bp
-from ticket_app import ticket_bp
-from ticket_status_app import ticket_status_bp
-from venue_app import venue_bp
-from event_venue_app import event_venue_bp
 from config import Config
+import metrics
+import compression
+import idempotency
+import routing
+import migrate
+import importer
+from serializer import JSONProvider
+
+# Blueprints by name: "module:attribute"
+BLUEPRINTS = {
+    'attendee': 'attendee_app:attendee_bp',
+    'event': 'event_app:event_bp',
+    'purchase': 'purchase_app:purchase_bp',
+    'staff': 'staff_app:staff_bp',
+    'staff_venue': 'staff_venue_app:staff_venue_bp',
+    'supplier': 'supplier_app:supplier_bp',
+    'ticket': 'ticket_app:ticket_bp',
+    'ticket_status': 'ticket_status_app:ticket_status_bp',
+    'venue': 'venue_app:venue_bp',
+    'event_venue': 'event_venue_app:event_venue_bp',
+    'reservation': 'reservation_app:reservation_bp',
+    'stats': 'stats_app:stats_bp',
+    'changes': 'changes_app:changes_bp',
+    'export': 'export_app:export_bp',
+}
+
+# Blueprints served by each deployment role (APP_ROLE)
+ROLES = {
+    'all': list(BLUEPRINTS),
+    'sales': ['attendee', 'event', 'purchase', 'ticket', 'ticket_status', 'reservation', 'stats', 'changes'],
+    'backoffice': ['event', 'venue', 'event_venue', 'staff', 'staff_venue', 'supplier', 'ticket_status', 'changes', 'export'],
+}
+
+"""
+Application factory.
+Development server: python app/main.py
+Production (see gunicorn_conf.py): gunicorn -c app/gunicorn_conf.py "main:create_app()"
+
+Nothing touches the database while the app is built: the engine connects on the first
+request. The schema belongs to init.sql; set DB_CREATE_ALL=1 (or pass create_all=True)
+to create missing tables, e.g. against an empty SQLite file; databases made from an older
+init.sql catch up with "flask db upgrade" (migrate.py).
+GET requests read from the replicas in DATABASE_REPLICA_URLS, if any (routing.py).
+APP_ROLE picks a preset from ROLES, APP_BLUEPRINTS="attendee,event,..." an explicit list;
+/internal/*, /metrics, /healthz and /readyz are always served.
+"""
+def create_app(blueprints=None, create_all=None, config=None):
+    # Database Configuration
+    app = Flask(__name__)
+    app.json = JSONProvider(app)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    db.init_app(app)
+    routing.init_app(app)
+    metrics.init_app(app)
+    compression.init_app(app)
+    idempotency.init_app(app)
+
+    # Every module is imported so all models and foreign keys are known,
+    # but only the selected blueprints are registered
+    if blueprints is None:
+        blueprints = app.config['APP_BLUEPRINTS'] or ROLES[app.config['APP_ROLE']]
+    unknown = set(blueprints) - set(BLUEPRINTS)
+    if unknown:
+        raise ValueError(f"Unknown blueprints: {', '.join(sorted(unknown))}")
+    modules = {name: importlib.import_module(path.split(':')[0]) for name, path in BLUEPRINTS.items()}
+
+    # Blueprint Registration
+    for name in blueprints:
+        module, attribute = BLUEPRINTS[name].split(':')
+        app.register_blueprint(getattr(modules[name], attribute))
+    app.register_blueprint(importlib.import_module('internal_app').internal_bp)
+
+    # Create all tables (only when asked)
+    if create_all is None:
+        create_all = app.config['DB_CREATE_ALL']
+    if create_all:
+        with app.app_context():
+            migrate.create_all()
+
+    # Commands: flask db upgrade|status|stamp|explain, flask import <entity> <file>
+    migrate.init_app(app)
+    importer.init_app(app)
+
+    # Commands: flask intake-worker, flask export worker|run
+    importlib.import_module('intake_worker').init_app(app)
+    importlib.import_module('export_worker').init_app(app)
+
+    return app
+
+
+def start_workers(app):
+    """Start the INTAKE_WORKERS and EXPORT_WORKERS threads of a server process.
+
+    Called by the servers (gunicorn_conf.py, __main__ below), never by
+    create_app(): "flask db upgrade", "flask import"... build the app too and
+    must not drain the queues.
+    """
+    if app.config['INTAKE_WORKERS'] > 0:
+        importlib.import_module('intake_worker').start_workers(app, app.config['INTAKE_WORKERS'])
+    if app.config['EXPORT_WORKERS'] > 0:
+        importlib.import_module('export_worker').start_workers(app, app.config['EXPORT_WORKERS'])
 
-# Database Configuration
-app = Flask(__name__)
-app.config.from_object(Config) 
-db.init_app(app)
-
-# Blueprint Registration
-app.register_blueprint(attendee_bp)
-app.register_blueprint(event_bp)
-app.register_blueprint(purchase_bp)
-app.register_blueprint(staff_bp)
-app.register_blueprint(staff_venue_bp)
-app.register_blueprint(supplier_bp)
-app.register_blueprint(ticket_bp)
-app.register_blueprint(ticket_status_bp)
-app.register_blueprint(venue_bp)
-app.register_blueprint(event_venue_bp)
-
-# Create all tables
-with app.app_context():
-    db.create_all()
 
 if __name__ == '__main__':
+    app = create_app()
+    start_workers(app)
     app.run(debug=False, host="0.0.0.0")
-
@@ -0,0 +1,235 @@
+# Header
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import Counter
+from flask import request, g, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+"""
+Request instrumentation: latency per endpoint, SQL statements and database
+time per request, exposed in Prometheus text format by GET /metrics
+(internal_app.py) and per response in a Server-Timing header:
+
+curl -i http://localhost:5000/events
+Server-Timing: app;dur=8.1, db;dur=2.4;desc="2 queries"
+
+Requests that run the same SQL statement METRICS_REPEATED_SQL times or more
+(an N+1 pattern such as a Query.get per item) are counted and logged.
+PROFILE_SAMPLE_RATE runs cProfile on that fraction of requests and keeps the
+ones slower than PROFILE_SLOW_SECONDS: written to PROFILE_DIR as .prof files
+when it is set, otherwise logged as the top functions by cumulative time.
+
+Streamed responses (?stream=1) read their rows while the body is sent:
+they are recorded once the body is done, but Server-Timing, sent with the
+headers, only covers the work before the first row.
+
+Like /internal/pool, the numbers belong to the gunicorn worker that answers;
+the "worker" label (its pid) tells the series apart.
+"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+PROFILE_LINES = 25
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {round(self.sum, 6)}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.latency = {}
+        self.statements = {}
+        self.sql_seconds = Counter()
+        self.repeated = Counter()
+
+    def record(self, method, endpoint, status, duration, statements, sql_seconds, repeated):
+        with self.lock:
+            self.requests[(method, endpoint, status)] += 1
+            self.latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(duration)
+            self.statements.setdefault(endpoint, Histogram(STATEMENT_BUCKETS)).observe(statements)
+            self.sql_seconds[endpoint] += sql_seconds
+            if repeated:
+                self.repeated[endpoint] += 1
+
+    def render(self):
+        worker = f'worker="{os.getpid()}"'
+        lines = []
+        with self.lock:
+            lines += ['# HELP app_requests_total Requests served.', '# TYPE app_requests_total counter']
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'app_requests_total{{{worker},method="{method}",endpoint="{endpoint}",status="{status}"}} {count}')
+
+            lines += ['# HELP app_request_duration_seconds Request latency.',
+                      '# TYPE app_request_duration_seconds histogram']
+            for endpoint, histogram in sorted(self.latency.items()):
+                lines += histogram.lines('app_request_duration_seconds', f'{worker},endpoint="{endpoint}"')
+
+            lines += ['# HELP app_request_sql_statements SQL statements run per request.',
+                      '# TYPE app_request_sql_statements histogram']
+            for endpoint, histogram in sorted(self.statements.items()):
+                lines += histogram.lines('app_request_sql_statements', f'{worker},endpoint="{endpoint}"')
+
+            lines += ['# HELP app_request_sql_seconds_total Time spent in SQL statements.',
+                      '# TYPE app_request_sql_seconds_total counter']
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'app_request_sql_seconds_total{{{worker},endpoint="{endpoint}"}} {round(seconds, 6)}')
+
+            lines += ['# HELP app_request_repeated_sql_total Requests that repeated one SQL statement (N+1).',
+                      '# TYPE app_request_repeated_sql_total counter']
+            for endpoint, count in sorted(self.repeated.items()):
+                lines.append(f'app_request_repeated_sql_total{{{worker},endpoint="{endpoint}"}} {count}')
+        return lines
+
+
+registry = Registry()
+profiling = threading.Lock()
+fetched = object()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def finish_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['statement_start'].pop()
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements[statement] += 1
+        g.sql_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def fail_statement(exception_context):
+    # after_cursor_execute is skipped when the statement fails (an IntegrityError turned into a 409...):
+    # drop its start time, or the pooled connection keeps it for good
+    conn = exception_context.connection
+    started = conn.info.get('statement_start') if conn is not None else None
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context() and 'sql_statements' in g and exception_context.statement:
+        g.sql_statements[exception_context.statement] += 1
+        g.sql_seconds += elapsed
+
+
+def fetching(rows):
+    """Iterate rows counting the wait for each one as database time: a streamed result
+    (server-side cursor) is fetched after its statement returned."""
+    rows = iter(rows)
+    while True:
+        started = time.perf_counter()
+        counted = g.get('sql_seconds', 0.0)
+        row = next(rows, fetched)
+        if 'sql_seconds' in g:
+            # Includes any statement next() ran, which the cursor events counted already
+            g.sql_seconds = counted + time.perf_counter() - started
+        if row is fetched:
+            return
+        yield row
+
+
+def start_request():
+    g.request_start = time.perf_counter()
+    g.sql_statements = Counter()
+    g.sql_seconds = 0.0
+    g.profile = None
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    # cProfile allows one active profiler per process
+    if rate and random.random() < rate and profiling.acquire(blocking=False):
+        g.profile = cProfile.Profile()
+        g.profile.enable()
+
+
+def stop_profile(endpoint, duration):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    profile.disable()
+    profiling.release()
+    config = current_app.config
+    if duration < config['PROFILE_SLOW_SECONDS']:
+        return
+    if config['PROFILE_DIR']:
+        name = f"{int(time.time() * 1000)}-{request.endpoint or 'unmatched'}.prof"
+        profile.dump_stats(os.path.join(config['PROFILE_DIR'], name))
+    else:
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        current_app.logger.warning("Slow request %s %s (%.3fs)\n%s", request.method, request.full_path, duration, out.getvalue())
+
+
+def record_request(app, method, endpoint, status, collected):
+    """Add a finished request to the registry; collected is the request's g."""
+    duration = time.perf_counter() - collected.request_start
+    statements = sum(collected.sql_statements.values())
+    statement, repeats = (collected.sql_statements.most_common(1) or [(None, 0)])[0]
+    repeated = repeats >= app.config['METRICS_REPEATED_SQL']
+    if repeated:
+        app.logger.warning("%s %s ran the same statement %d times: %s",
+                           method, endpoint, repeats, ' '.join(statement.split())[:200])
+    registry.record(method, endpoint, status, duration, statements, collected.sql_seconds, repeated)
+
+
+def finish_request(response):
+    if 'request_start' not in g:
+        return response
+    duration = time.perf_counter() - g.request_start
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    stop_profile(endpoint, duration)
+
+    statements = sum(g.sql_statements.values())
+    response.headers['Server-Timing'] = (
+        f'app;dur={duration * 1000:.1f}, db;dur={g.sql_seconds * 1000:.1f};desc="{statements} queries"'
+    )
+    args = (current_app._get_current_object(), request.method, endpoint, response.status_code, g._get_current_object())
+    if response.is_streamed:
+        # The body is generated after this (stream_with_context keeps g): record it once it is sent
+        response.call_on_close(lambda: record_request(*args))
+    else:
+        record_request(*args)
+    return response
+
+
+def abort_profile(error):
+    # after_request is skipped when the view raises; never leave the profiler running
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+        profiling.release()
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(abort_profile)
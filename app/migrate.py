@@ -0,0 +1,179 @@
+# Header
+import datetime
+import os
+import re
+import click
+from use_db import db
+from sqlalchemy import Column, String, DateTime, select, inspect, text
+
+"""
+Versioned schema migrations for databases created from an older init.sql.
+
+Each file in migrations/ ("<version>_<name>.sql", applied in version order)
+is a list of ";"-terminated statements. schema_migrations records the
+versions a database already has; init.sql records the ones it includes, so
+a fresh database starts up to date. 0000 creates the tables init.sql
+gained without a migration, so a database made from the original init.sql
+(no schema_migrations table yet) upgrades too.
+
+cd app
+flask --app "main:create_app()" db status
+flask --app "main:create_app()" db upgrade
+flask --app "main:create_app()" db explain
+
+tests/test_hot_queries.py fails when one of hot_queries() stops using an index.
+
+MySQL commits every DDL statement on its own: if a migration fails half way,
+fix the cause and finish the remaining statements by hand before "db stamp".
+"""
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_\w+\.sql$')
+
+
+# SQLAlchemy Model
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    version = Column(String(64), primary_key=True)
+    applied_at = Column(DateTime, nullable=False)
+
+
+def migrations():
+    """[(version, path)] of every migration file, oldest first."""
+    found = []
+    for name in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(name)
+        if match:
+            found.append((match.group(1), os.path.join(MIGRATIONS_DIR, name)))
+    return sorted(found)
+
+
+def statements(path):
+    with open(path) as f:
+        lines = [line for line in f if not line.lstrip().startswith('--')]
+    return [statement.strip() for statement in ''.join(lines).split(';') if statement.strip()]
+
+
+def applied():
+    if not inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return set()
+    return set(db.session.scalars(select(SchemaMigration.version)))
+
+
+def mark(version):
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    db.session.add(SchemaMigration(version=version, applied_at=now))
+    db.session.commit()
+
+
+def upgrade(echo=print):
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    done = applied()
+    pending = [(version, path) for version, path in migrations() if version not in done]
+    for version, path in pending:
+        echo(f"Applying {os.path.basename(path)}")
+        for statement in statements(path):
+            db.session.execute(text(statement))
+        db.session.commit()
+        mark(version)
+    return len(pending)
+
+
+def stamp():
+    """Record every migration as applied, for a schema built from the current models or init.sql."""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    done = applied()
+    for version, _ in migrations():
+        if version not in done:
+            mark(version)
+
+
+def create_all():
+    """db.create_all(); a new, empty database gets the current schema, so nothing is pending."""
+    fresh = not inspect(db.engine).get_table_names()
+    db.create_all()
+    if fresh:
+        stamp()
+
+
+def hot_queries():
+    """(name, statement) of the lookups the handlers run on every request."""
+    tables = db.metadata.tables
+    event_venue, staff_venue = tables['event_venue'], tables['staff_venue']
+    venue, supplier, attendee, purchase = tables['venue'], tables['supplier'], tables['attendee'], tables['purchase']
+    ticket = tables['ticket']
+    return [
+        ("POST /event_venues: existing assignment",
+         select(event_venue).where(event_venue.c.ev_id == 1, event_venue.c.vn_id == 1).limit(1)),
+        ("GET /event_venues/<ev_id>",
+         select(event_venue).where(event_venue.c.ev_id == 1).order_by(event_venue.c.ev_ven_id)),
+        ("GET /staff_venue/<vn_id>",
+         select(staff_venue).where(staff_venue.c.vn_id == 1).order_by(staff_venue.c.sv_id)),
+        ("POST/PUT /venues: name taken",
+         select(venue).where(venue.c.vn_name == 'x').limit(1)),
+        ("POST/PUT /suppliers: company taken",
+         select(supplier).where(supplier.c.sup_company_name == 'x').limit(1)),
+        ("POST /attendees: email taken",
+         select(attendee).where(attendee.c.att_email == 'x').limit(1)),
+        ("GET /purchases?tic_id=, ticket delete",
+         select(purchase).where(purchase.c.tic_id == 1).order_by(purchase.c.att_id, purchase.c.tic_id)),
+        ("GET /purchases?sort=purchase_date, date ranges",
+         select(purchase).where(purchase.c.purchase_date >= '2024-01-01')
+         .order_by(purchase.c.purchase_date, purchase.c.att_id, purchase.c.tic_id).limit(100)),
+        ("GET /purchases?purchase_type=",
+         select(purchase).where(purchase.c.purchase_type == 'Online')
+         .order_by(purchase.c.att_id, purchase.c.tic_id).limit(100)),
+        ("GET /tickets?tic_type=",
+         select(ticket).where(ticket.c.tic_type == 'VIP').order_by(ticket.c.tic_id).limit(100)),
+        ("GET /venues?vn_type=",
+         select(venue).where(venue.c.vn_type == 'VIP').order_by(venue.c.vn_id).limit(100)),
+    ]
+
+
+def explain(stmt):
+    """(plan lines, full table scan?) of stmt on the current database."""
+    dialect = db.engine.dialect
+    sql = str(stmt.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        lines = [row.detail for row in rows]
+        return lines, any(line.startswith('SCAN ') and 'TEMP B-TREE' not in line for line in lines)
+    rows = [dict(row._mapping) for row in db.session.execute(text(f"EXPLAIN {sql}"))]
+    lines = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in rows]
+    return lines, any(row['type'] in ('ALL', 'index') for row in rows)
+
+
+def init_app(app):
+    @app.cli.group('db')
+    def db_cli():
+        """Schema migrations."""
+
+    @db_cli.command('upgrade')
+    def upgrade_command():
+        """Apply the pending migrations."""
+        click.echo(f"{upgrade(echo=click.echo)} migrations applied")
+
+    @db_cli.command('stamp')
+    def stamp_command():
+        """Mark every migration as applied without running it."""
+        stamp()
+
+    @db_cli.command('status')
+    def status_command():
+        """List the migrations and whether they are applied."""
+        done = applied()
+        for version, path in migrations():
+            click.echo(f"{'applied' if version in done else 'pending'}  {os.path.basename(path)}")
+
+    @db_cli.command('explain')
+    def explain_command():
+        """EXPLAIN the hot queries; exit status 1 if any scans a whole table."""
+        scans = 0
+        for name, stmt in hot_queries():
+            lines, scan = explain(stmt)
+            scans += scan
+            click.echo(f"{'SCAN' if scan else 'ok  '}  {name}")
+            for line in lines:
+                click.echo(f"      {line}")
+        if scans:
+            raise SystemExit(1)
@@ -0,0 +1,250 @@
+# Header
+import base64
+import datetime
+import json
+from urllib.parse import urlencode
+from flask import request, jsonify, Response, stream_with_context
+from marshmallow import ValidationError
+from marshmallow.fields import Nested
+from sqlalchemy import inspect, and_, or_
+from sqlalchemy.orm import load_only
+from expand import ExpandError, expand as expand_related
+from serializer import plain_columns, dumps
+from metrics import fetching
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+STREAM_BATCH = 1000
+NDJSON = 'application/x-ndjson'
+OPERATORS = {
+    'eq': lambda column, value: column == value,
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+}
+# Query parameters that are not filters
+RESERVED = {'limit', 'after', 'stream', 'sort', 'fields', 'expand'}
+
+"""
+Keyset (cursor) pagination shared by every collection GET endpoint.
+
+The cursor is an opaque, URL-safe token holding the sort key of the last
+row of the page, so the next page is fetched with an indexed
+"WHERE key > <cursor> ORDER BY key LIMIT n" instead of an OFFSET scan.
+Composite keys such as (att_id, tic_id) on purchase are compared row-wise.
+
+curl "http://localhost:5000/attendees?limit=50"
+curl "http://localhost:5000/attendees?limit=50&after=<cursor>"
+The link to the next page is returned in the "Link" header (rel="next").
+
+Each endpoint whitelists the columns it can be filtered and sorted by:
+curl "http://localhost:5000/tickets?ev_id=1&tic_status_id=1"
+curl "http://localhost:5000/purchases?purchase_date__gte=2024-06-01&purchase_date__lt=2024-07-01&sort=-purchase_date"
+curl "http://localhost:5000/tickets?tic_type__in=VIP,Premium&fields=tic_id,tic_type"
+Operators: field=, field__gt=, field__gte=, field__lt=, field__lte=, field__in=a,b.
+"fields" only reads and returns the listed columns (the key columns are always read).
+Endpoints that pass expand= also accept ?expand= (see expand.py).
+
+Pages are served from Core rows instead of ORM instances whenever the
+schema only has plain column fields (see serializer.py).
+
+Export mode streams the whole collection (from "after" on) as one JSON
+object per line, reading rows through a server-side cursor in batches:
+curl -H "Accept: application/x-ndjson" http://localhost:5000/purchases
+curl "http://localhost:5000/tickets?stream=1"
+"""
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime.date) else value for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, order, schema):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(order):
+        raise PaginationError("Invalid cursor")
+    return [parse_value(schema, column.key, value, "Invalid cursor") for (column, _), value in zip(order, values)]
+
+
+def parse_value(schema, name, value, error):
+    field = schema.fields.get(name)
+    if field is None:
+        return value
+    try:
+        return field.deserialize(value)
+    except ValidationError:
+        raise PaginationError(error)
+
+
+def parse_limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise PaginationError("limit must be an integer")
+    if limit < 1 or limit > MAX_LIMIT:
+        raise PaginationError(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def entity_of(query):
+    return query.column_descriptions[0]['entity']
+
+
+def primary_key(query):
+    return list(inspect(entity_of(query)).primary_key)
+
+
+def apply_filters(query, schema, allowed):
+    entity = entity_of(query)
+    for param, raw in request.args.items():
+        if param in RESERVED:
+            continue
+        name, _, operator = param.partition('__')
+        if name not in allowed:
+            if name in schema.fields:
+                raise PaginationError(f"Filtering on {name} is not supported")
+            continue
+        column = getattr(entity, name)
+        error = f"Invalid value for {param}"
+        if operator == 'in':
+            values = [parse_value(schema, name, value, error) for value in raw.split(',')]
+            query = query.filter(column.in_(values))
+        elif operator in OPERATORS or not operator:
+            value = parse_value(schema, name, raw, error)
+            query = query.filter(OPERATORS[operator or 'eq'](column, value))
+        else:
+            raise PaginationError(f"Unknown operator in {param}")
+    return query
+
+
+def sort_order(query, allowed):
+    """List of (column, descending): the sort column first, then the primary key."""
+    keys = primary_key(query)
+    sort = request.args.get('sort')
+    if not sort:
+        return [(column, False) for column in keys]
+    descending = sort.startswith('-')
+    name = sort.lstrip('-')
+    if name not in allowed and name not in [column.key for column in keys]:
+        raise PaginationError(f"Sorting by {name} is not supported")
+    column = getattr(entity_of(query), name)
+    order = [(column, descending)]
+    order += [(key, descending) for key in keys if key.key != name]
+    return order
+
+
+def select_fields(schema, shown=(), hidden=()):
+    fields = request.args.get('fields')
+    if not fields:
+        return schema.__class__(many=True, exclude=hidden)
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in schema.fields]
+    if unknown or not names:
+        raise PaginationError(f"Unknown fields: {', '.join(unknown)}")
+    only = names + sorted({field.split('.')[0] for field in shown})
+    return schema.__class__(many=True, only=only, exclude=hidden)
+
+
+def row_serializer(query, schema, order):
+    """Return (query, dump): Core rows turned into dicts when every field is a plain column, else Schema.dump."""
+    entity = entity_of(query)
+    columns = plain_columns(schema, entity)
+    if columns is None:
+        if schema.only:
+            keys = {field.attribute or name for name, field in schema.dump_fields.items()
+                    if not isinstance(field, Nested)}
+            keys |= {column.key for column, _ in order}
+            query = query.options(load_only(*[getattr(entity, key) for key in keys]))
+        return query, lambda row: schema.dump(row, many=False)
+    names = [name for name, _ in columns]
+    selected = {column.key for _, column in columns}
+    # The sort key columns are read for the cursor even when they are not returned
+    extra = [column for column, _ in order if column.key not in selected]
+    query = query.with_entities(*[column for _, column in columns], *extra)
+    return query, lambda row: dict(zip(names, row))
+
+
+def after_clause(order, values):
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y); "<" when descending
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal = [order[j][0] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+def order_by(query, order, schema):
+    after = request.args.get('after')
+    if after:
+        query = query.filter(after_clause(order, decode_cursor(after, order, schema)))
+    return query.order_by(*[column.desc() if descending else column for column, descending in order])
+
+
+def next_link(cursor):
+    args = request.args.to_dict()
+    args['after'] = cursor
+    return f"{request.base_url}?{urlencode(args)}"
+
+
+def fetch_page(query, order):
+    """Return (rows, next_cursor) for the current request's limit."""
+    limit = parse_limit()
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, column.key) for column, _ in order)
+
+
+def wants_stream():
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == NDJSON
+
+
+def stream(query, dump):
+    # yield_per turns on stream_results, which PyMySQL serves with an SSCursor
+    rows = query.yield_per(STREAM_BATCH)
+
+    def generate():
+        for row in fetching(rows):
+            yield dumps(dump(row)) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def paginate(query, schema, not_found, filters=(), sorts=(), expand=None):
+    try:
+        query = apply_filters(query, schema, filters)
+        order = sort_order(query, sorts)
+        query = order_by(query, order, schema)
+        query, shown, hidden = expand_related(query, expand or {})
+        schema = select_fields(schema, shown, hidden)
+        query, dump = row_serializer(query, schema, order)
+        if wants_stream():
+            return stream(query, dump), 200
+        rows, cursor = fetch_page(query, order)
+    except (PaginationError, ExpandError) as e:
+        return jsonify({"Error": str(e)}), 400
+
+    if not rows:
+        return jsonify({"Error": not_found}), 404
+
+    response = jsonify([dump(row) for row in rows])
+    if cursor:
+        response.headers['Link'] = f'<{next_link(cursor)}>; rel="next"'
+    return response, 200
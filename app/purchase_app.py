@@ -1,23 +1,41 @@
 # Header
+from collections import Counter
 from flask import Blueprint, request, jsonify
 from use_db import db
+from pagination import paginate
+from conditional import conditional
 from marshmallow import Schema, fields, validate
-from sqlalchemy import Column, Integer, String, Date
+from sqlalchemy import Column, Integer, Enum, Date, ForeignKey, Index, insert, tuple_
+from sqlalchemy.exc import IntegrityError
 from attendee_app import Attendee
 from ticket_app import Ticket
+from inventory import SoldOut, reserve, release, consume_hold
+from rollup import record, sale
+from intake import PurchaseIntake, enqueue, describe
+from changes import log_changes
+from routing import use_primary
 
 purchase_bp = Blueprint('purchase_bp', __name__)
 
+BULK_LIMIT = 1000
+
 # SQLAlchemy Model
 class Purchase(db.Model):
     __tablename__ = 'purchase'
-    __table_args__ = (db.PrimaryKeyConstraint('att_id', 'tic_id'),)
+    __table_args__ = (
+        db.PrimaryKeyConstraint('att_id', 'tic_id'),
+        Index('idx_purchase_ticket', 'tic_id'),
+        # sort=purchase_date pages and date range filters, in keyset order
+        Index('idx_purchase_date', 'purchase_date', 'att_id', 'tic_id'),
+        # ?purchase_type= pages, in keyset order
+        Index('idx_purchase_type', 'purchase_type', 'att_id', 'tic_id'),
+    )
 
 
-    att_id = Column(Integer, primary_key=True)
-    tic_id = Column(Integer, primary_key=True)
+    att_id = Column(Integer, ForeignKey('attendee.att_id', ondelete='CASCADE'), primary_key=True)
+    tic_id = Column(Integer, ForeignKey('ticket.tic_id', ondelete='CASCADE'), primary_key=True)
     purchase_date = Column(Date, nullable=False)
-    purchase_type = Column(String(20), nullable=False)
+    purchase_type = Column(Enum('Online', 'Mobile App', 'Box Office'), nullable=False)
 
 # Marshmallow Schema
 class PurchaseSchema(Schema):
@@ -38,11 +56,11 @@ purchases_schema = PurchaseSchema(many=True)
 curl http://localhost:5000/purchases
 """
 @purchase_bp.route('/purchases', methods=['GET'])
+@conditional('purchase')
 def get_purchases():
-    all_purchases = Purchase.query.all()
-    if not all_purchases:
-        return jsonify({"Error": "Purchases not found"}), 404
-    return jsonify(purchases_schema.dump(all_purchases)), 200
+    return paginate(Purchase.query, purchases_schema, "Purchases not found",
+                    filters=('att_id', 'tic_id', 'purchase_type', 'purchase_date'),
+                    sorts=('purchase_date',))
 
 
 """
@@ -50,6 +68,7 @@ def get_purchases():
 curl http://localhost:5000/purchases/<attendee_id>/<ticket_id>
 """
 @purchase_bp.route('/purchases/<int:att_id>/<int:tic_id>', methods=['GET'])
+@conditional('purchase')
 def get_purchase(att_id, tic_id):
     purchase = Purchase.query.get((att_id, tic_id))
     if not purchase:
@@ -60,6 +79,10 @@ def get_purchase(att_id, tic_id):
 """
 First we should create the ticket
 -> POST new purchase
+When the event has ticket inventory the sale takes a seat from it (409 when sold out);
+pass ?hold_id=<hold_id> to buy a seat held with POST /events/<event_id>/holds instead.
+With ?async=1 the purchase is only validated and queued: 202 with a status URL
+(GET /purchases/intake/<intake_id>), written later by the intake workers (intake_worker.py).
 curl -X POST http://localhost:5000/purchases \
     -H "Content-Type: application/json" \
     -d '{
@@ -75,6 +98,15 @@ def add_purchase():
     errors = purchase_schema.validate(data)
     if errors:
         return jsonify({"Error": "Invalid data", "details": errors}), 400
+
+    if request.args.get('async') in ('1', 'true'):
+        if 'hold_id' in request.args:
+            return jsonify({"Error": "hold_id cannot be used with async=1"}), 400
+        row = enqueue(data)
+        status_url = f"/purchases/intake/{row.intake_id}"
+        response = jsonify({"intake_id": row.intake_id, "status": row.status, "status_url": status_url})
+        response.headers['Location'] = status_url
+        return response, 202
     
     existing = Purchase.query.get((data['att_id'], data['tic_id']))
     if existing:
@@ -82,7 +114,8 @@ def add_purchase():
 
     if not Attendee.query.get(data['att_id']):
         return jsonify({"Error": "Attendee not found"}), 404
-    if not Ticket.query.get(data['tic_id']):
+    ticket = Ticket.query.get(data['tic_id'])
+    if not ticket:
         return jsonify({"Error": "Ticket not found"}), 404
 
     new_purchase = Purchase(
@@ -92,10 +125,138 @@ def add_purchase():
         purchase_type=data['purchase_type']
     )
     db.session.add(new_purchase)
-    db.session.commit()
+    try:
+        # Insert first so the inventory row is locked for as short as possible
+        db.session.flush()
+        hold_id = request.args.get('hold_id', type=int)
+        if hold_id:
+            if not consume_hold(hold_id, ticket.ev_id, ticket.tic_type):
+                db.session.rollback()
+                return jsonify({"Error": "Hold not found, expired or used up"}), 409
+        else:
+            reserve(ticket.ev_id, ticket.tic_type, 1)
+        record({sale(ticket, data['purchase_type'], data['purchase_date']): 1})
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"Error": "Purchase already exists"}), 409
+    except SoldOut as e:
+        db.session.rollback()
+        return jsonify({"Error": str(e)}), 409
     return jsonify(purchase_schema.dump(new_purchase)), 201
 
 
+"""
+-> POST many purchases in one transaction
+curl -X POST http://localhost:5000/purchases/bulk \
+    -H "Content-Type: application/json" \
+    -d '[
+            {"att_id": <attendee_id>, "tic_id": <ticket_id>, "purchase_date": "<year-month-day>", "purchase_type": "<type_of_purchase>"},
+            ...
+        ]'
+Every item gets its own result (201, 400, 404 or 409); the valid ones are inserted together.
+"""
+@purchase_bp.route('/purchases/bulk', methods=['POST'])
+def add_purchases_bulk():
+    data = request.json
+    if not isinstance(data, list) or not data:
+        return jsonify({"Error": "Expected a non-empty list of purchases"}), 400
+    if len(data) > BULK_LIMIT:
+        return jsonify({"Error": f"At most {BULK_LIMIT} purchases per request"}), 413
+
+    results = create_purchases(data)
+    if results is None:
+        return jsonify({"Error": "Purchases conflicted with a concurrent request, retry"}), 409
+
+    created = sum(1 for result in results if result['status'] == 201)
+    status = 201 if created == len(results) else 207
+    return jsonify({"created": created, "results": results}), status
+
+
+def create_purchases(items, commit=True):
+    errors = purchases_schema.validate(items)
+    results = [None] * len(items)
+    candidates = {}
+    for index, item in enumerate(items):
+        if index in errors:
+            results[index] = {"status": 400, "Error": "Invalid data", "details": errors[index]}
+            continue
+        purchase = purchase_schema.load(item)
+        key = (purchase['att_id'], purchase['tic_id'])
+        if key in candidates:
+            results[index] = {"status": 409, "Error": "Duplicate purchase in batch"}
+            continue
+        candidates[key] = (index, purchase)
+
+    if candidates:
+        existing = set(
+            Purchase.query
+            .with_entities(Purchase.att_id, Purchase.tic_id)
+            .filter(tuple_(Purchase.att_id, Purchase.tic_id).in_(list(candidates)))
+            .all()
+        )
+        attendees = {row.att_id for row in Attendee.query.with_entities(Attendee.att_id)
+                     .filter(Attendee.att_id.in_({key[0] for key in candidates}))}
+        tickets = {row.tic_id: row for row in Ticket.query
+                   .with_entities(Ticket.tic_id, Ticket.ev_id, Ticket.tic_type, Ticket.tic_status_id)
+                   .filter(Ticket.tic_id.in_({key[1] for key in candidates}))}
+
+    groups = {}
+    for (att_id, tic_id), (index, purchase) in candidates.items():
+        if (att_id, tic_id) in existing:
+            results[index] = {"status": 409, "Error": "Purchase already exists"}
+        elif att_id not in attendees:
+            results[index] = {"status": 404, "Error": "Attendee not found"}
+        elif tic_id not in tickets:
+            results[index] = {"status": 404, "Error": "Ticket not found"}
+        else:
+            ticket = tickets[tic_id]
+            groups.setdefault((ticket.ev_id, ticket.tic_type), []).append((index, purchase))
+
+    # One counter update per (event, ticket type); a group that does not fit is rejected whole
+    rows = []
+    for (ev_id, tic_type), group in groups.items():
+        try:
+            reserve(ev_id, tic_type, len(group))
+        except SoldOut as e:
+            for index, purchase in group:
+                results[index] = {"status": 409, "Error": str(e)}
+            continue
+        for index, purchase in group:
+            rows.append(purchase)
+            results[index] = {"status": 201, **purchase_schema.dump(purchase)}
+
+    if rows:
+        try:
+            db.session.execute(insert(Purchase), rows)
+            log_changes('purchase', [(row['att_id'], row['tic_id']) for row in rows], 'insert')
+            record(Counter(
+                sale(tickets[row['tic_id']], row['purchase_type'], row['purchase_date'])
+                for row in rows
+            ))
+            if commit:
+                db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+    return results
+
+
+"""
+-> GET status of a purchase queued with POST /purchases?async=1
+status is "queued", then "done" (created) or "failed"; result holds the item's result as in /purchases/bulk
+(read from the primary, a replica may not have the worker's update yet)
+curl http://localhost:5000/purchases/intake/<intake_id>
+"""
+@purchase_bp.route('/purchases/intake/<int:intake_id>', methods=['GET'])
+@use_primary
+def get_purchase_intake(intake_id):
+    row = db.session.get(PurchaseIntake, intake_id)
+    if not row:
+        return jsonify({"Error": "Queued purchase not found"}), 404
+    return jsonify(describe(row)), 200
+
+
 """
 -> PUT update purchase
 curl -X PUT http://localhost:5000/purchases/<attendee_id>/<ticket_id> \
@@ -113,10 +274,16 @@ def update_purchase(att_id, tic_id):
     if errors:
         return jsonify({"Error": "Invalid data", "details": errors}), 400
     
+    ticket = Ticket.query.get(tic_id)
+    before = sale(ticket, purchase.purchase_type, purchase.purchase_date)
     if 'purchase_date' in data:
         purchase.purchase_date = data['purchase_date']
     if 'purchase_type' in data:
         purchase.purchase_type = data['purchase_type']
+    after = sale(ticket, purchase.purchase_type, purchase.purchase_date)
+    if [str(value) for value in after] != [str(value) for value in before]:
+        record({before: 1}, sign=-1)
+        record({after: 1})
     db.session.commit()
     return jsonify(purchase_schema.dump(purchase)), 200
 
@@ -131,6 +298,10 @@ def delete_purchase(att_id, tic_id):
     if not purchase:
         return jsonify({"Error": "Purchase not found"}), 404
     
+    ticket = Ticket.query.get(tic_id)
+    if ticket:
+        release(ticket.ev_id, ticket.tic_type, 1)
+        record({sale(ticket, purchase.purchase_type, purchase.purchase_date): 1}, sign=-1)
     db.session.delete(purchase)
     db.session.commit()
     return jsonify({"Message": "Purchase deleted"}), 200
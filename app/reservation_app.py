@@ -0,0 +1,166 @@
+# Header
+from flask import Blueprint, request, jsonify
+from use_db import db
+from cache import exists, recheck
+from marshmallow import Schema, fields, validate
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from event_app import Event
+from venue_app import Venue
+from event_venue_app import EventVenue
+from ticket_app import Ticket
+from purchase_app import Purchase
+from inventory import TicketInventory, TicketHold, SoldOut, hold, drop_hold, release_expired, utcnow
+from routing import use_primary
+
+reservation_bp = Blueprint('reservation_bp', __name__)
+
+TIC_TYPES = ['VIP', 'General', 'Premium']
+MAX_HOLD_TTL = 3600
+
+# Marshmallow Schemas
+class TicketInventorySchema(Schema):
+    ev_id = fields.Int(dump_only=True)
+    tic_type = fields.Str(dump_only=True)
+    capacity = fields.Int(dump_only=True)
+    available = fields.Int(dump_only=True)
+
+class TicketHoldSchema(Schema):
+    hold_id = fields.Int(dump_only=True)
+    ev_id = fields.Int(dump_only=True)
+    tic_type = fields.Str(required=True, validate=validate.OneOf(TIC_TYPES))
+    quantity = fields.Int(required=True, validate=validate.Range(min=1))
+    ttl = fields.Int(load_default=600, load_only=True, validate=validate.Range(min=1, max=MAX_HOLD_TTL))
+    expires_at = fields.DateTime(dump_only=True)
+
+inventories_schema = TicketInventorySchema(many=True)
+hold_schema = TicketHoldSchema()
+
+# Endpoints
+"""
+-> POST (re)build the counters of an event from the capacity of its venues
+Capacity per ticket type is the sum of vn_capacity of the event's venues of that vn_type;
+tickets already sold and seats on hold are subtracted.
+curl -X POST http://localhost:5000/events/<event_id>/inventory
+"""
+@reservation_bp.route('/events/<int:ev_id>/inventory', methods=['POST'])
+def build_inventory(ev_id):
+    if not exists(Event, ev_id):
+        return jsonify({"Error": "Event not found"}), 404
+
+    release_expired(ev_id)
+    # Lock the counters first so no sale slips in while they are recomputed
+    existing = {
+        row.tic_type: row
+        for row in TicketInventory.query.filter_by(ev_id=ev_id).with_for_update().all()
+    }
+    capacity = dict(
+        db.session.query(Venue.vn_type, func.sum(Venue.vn_capacity))
+        .join(EventVenue, EventVenue.vn_id == Venue.vn_id)
+        .filter(EventVenue.ev_id == ev_id)
+        .group_by(Venue.vn_type)
+        .all()
+    )
+    sold = dict(
+        db.session.query(Ticket.tic_type, func.count())
+        .join(Purchase, Purchase.tic_id == Ticket.tic_id)
+        .filter(Ticket.ev_id == ev_id)
+        .group_by(Ticket.tic_type)
+        .all()
+    )
+    held = dict(
+        db.session.query(TicketHold.tic_type, func.sum(TicketHold.quantity))
+        .filter(TicketHold.ev_id == ev_id)
+        .group_by(TicketHold.tic_type)
+        .all()
+    )
+
+    rows = []
+    for tic_type in TIC_TYPES:
+        total = int(capacity.get(tic_type) or 0)
+        available = max(total - sold.get(tic_type, 0) - int(held.get(tic_type) or 0), 0)
+        row = existing.get(tic_type)
+        if row:
+            row.capacity = total
+            row.available = available
+        else:
+            row = TicketInventory(ev_id=ev_id, tic_type=tic_type, capacity=total, available=available)
+            db.session.add(row)
+        rows.append(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # The event was deleted after it was cached
+        if recheck((Event, ev_id, "Event not found")):
+            return jsonify({"Error": "Event not found"}), 404
+        raise
+    return jsonify(inventories_schema.dump(rows)), 200
+
+
+"""
+-> GET the counters of an event
+curl http://localhost:5000/events/<event_id>/inventory
+"""
+@reservation_bp.route('/events/<int:ev_id>/inventory', methods=['GET'])
+@use_primary
+def get_inventory(ev_id):
+    if release_expired(ev_id):
+        db.session.commit()
+    rows = TicketInventory.query.filter_by(ev_id=ev_id).all()
+    if not rows:
+        return jsonify({"Error": "Inventory not initialized for this event"}), 404
+    return jsonify(inventories_schema.dump(rows)), 200
+
+
+"""
+-> POST hold tickets for a few minutes (ttl in seconds, default 600)
+curl -X POST http://localhost:5000/events/<event_id>/holds \
+    -H "Content-Type: application/json" \
+    -d '{"tic_type": "<ticket_type>", "quantity": <amount>, "ttl": <seconds>}'
+Buy a held ticket with: curl -X POST "http://localhost:5000/purchases?hold_id=<hold_id>" ...
+"""
+@reservation_bp.route('/events/<int:ev_id>/holds', methods=['POST'])
+def add_hold(ev_id):
+    data = request.json
+    errors = hold_schema.validate(data)
+    if errors:
+        return jsonify({"Error": "Invalid data", "details": errors}), 400
+    data = hold_schema.load(data)
+
+    release_expired(ev_id)
+    if not db.session.get(TicketInventory, (ev_id, data['tic_type'])):
+        db.session.commit()
+        return jsonify({"Error": "Inventory not initialized for this event"}), 404
+    try:
+        new_hold = hold(ev_id, data['tic_type'], data['quantity'], data['ttl'])
+        db.session.commit()
+    except SoldOut as e:
+        db.session.rollback()
+        return jsonify({"Error": str(e)}), 409
+    return jsonify(hold_schema.dump(new_hold)), 201
+
+
+"""
+-> GET one hold
+curl http://localhost:5000/holds/<hold_id>
+"""
+@reservation_bp.route('/holds/<int:hold_id>', methods=['GET'])
+def get_hold(hold_id):
+    found = TicketHold.query.get(hold_id)
+    if not found or found.expires_at <= utcnow():
+        return jsonify({"Error": "Hold not found"}), 404
+    return jsonify(hold_schema.dump(found)), 200
+
+
+"""
+-> DELETE release a hold and give its seats back
+curl -X DELETE http://localhost:5000/holds/<hold_id>
+"""
+@reservation_bp.route('/holds/<int:hold_id>', methods=['DELETE'])
+def delete_hold(hold_id):
+    if not drop_hold(hold_id):
+        db.session.rollback()
+        return jsonify({"Error": "Hold not found"}), 404
+    db.session.commit()
+    return jsonify({"Message": "Hold released"}), 200
@@ -0,0 +1,88 @@
+# Header
+from collections import Counter
+from use_db import db
+from sqlalchemy import Column, Integer, Enum, Date, ForeignKey, select, func, delete
+from sqlalchemy.dialects import mysql, sqlite
+
+"""
+Sales rollup: tickets sold per event, ticket type, ticket status, purchase
+type and day. The purchase and ticket write handlers keep it current with
+record(), so the stats endpoints (stats_app.py) read a few rollup rows instead
+of scanning purchase and ticket.
+"""
+
+KEY = ('ev_id', 'tic_type', 'tic_status_id', 'purchase_type', 'purchase_date')
+CHUNK = 1000
+
+# SQLAlchemy Model
+class EventSalesRollup(db.Model):
+    __tablename__ = 'event_sales_rollup'
+    ev_id = Column(Integer, ForeignKey('event.ev_id', ondelete='CASCADE'), primary_key=True)
+    tic_type = Column(Enum('VIP', 'General', 'Premium'), primary_key=True)
+    tic_status_id = Column(Integer, primary_key=True)
+    purchase_type = Column(Enum('Online', 'Mobile App', 'Box Office'), primary_key=True)
+    purchase_date = Column(Date, primary_key=True)
+    sold = Column(Integer, nullable=False, default=0)
+
+
+def record(groups, sign=1):
+    """Add (or with sign=-1 remove) sales; groups maps a KEY tuple to a count."""
+    rows = [dict(zip(KEY, key), sold=sign * count) for key, count in groups.items() if count]
+    table = EventSalesRollup.__table__
+    for start in range(0, len(rows), CHUNK):
+        chunk = rows[start:start + CHUNK]
+        if db.session.get_bind().dialect.name == 'mysql':
+            stmt = mysql.insert(EventSalesRollup).values(chunk)
+            stmt = stmt.on_duplicate_key_update(sold=table.c.sold + stmt.inserted.sold)
+        else:
+            stmt = sqlite.insert(EventSalesRollup).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(KEY),
+                set_={'sold': table.c.sold + stmt.excluded.sold}
+            )
+        db.session.execute(stmt)
+
+
+def sale(ticket, purchase_type, purchase_date):
+    return (ticket.ev_id, ticket.tic_type, ticket.tic_status_id, purchase_type, purchase_date)
+
+
+def sales_query(*criteria):
+    """Live GROUP BY over purchase and ticket, one row per KEY with its count."""
+    purchase = db.metadata.tables['purchase']
+    ticket = db.metadata.tables['ticket']
+    return (
+        select(ticket.c.ev_id, ticket.c.tic_type, ticket.c.tic_status_id,
+               purchase.c.purchase_type, purchase.c.purchase_date, func.count().label('sold'))
+        .select_from(purchase.join(ticket, purchase.c.tic_id == ticket.c.tic_id))
+        .where(*criteria)
+        .group_by(ticket.c.ev_id, ticket.c.tic_type, ticket.c.tic_status_id,
+                  purchase.c.purchase_type, purchase.c.purchase_date)
+    )
+
+
+def sales_of(*criteria):
+    return Counter({tuple(row[:5]): row.sold for row in db.session.execute(sales_query(*criteria))})
+
+
+def forget_ticket(tic_id):
+    """Call before a ticket is deleted: its purchases go with it (ON DELETE CASCADE). Returns the sales removed."""
+    sold = sales_of(db.metadata.tables['ticket'].c.tic_id == tic_id)
+    record(sold, sign=-1)
+    return sold
+
+
+def forget_attendee(att_id):
+    """Call before an attendee is deleted: their purchases go with them. Returns the sales removed."""
+    sold = sales_of(db.metadata.tables['purchase'].c.att_id == att_id)
+    record(sold, sign=-1)
+    return sold
+
+
+def rebuild(ev_id=None):
+    criteria = [] if ev_id is None else [db.metadata.tables['ticket'].c.ev_id == ev_id]
+    stmt = delete(EventSalesRollup)
+    if ev_id is not None:
+        stmt = stmt.where(EventSalesRollup.ev_id == ev_id)
+    db.session.execute(stmt)
+    record(sales_of(*criteria))
@@ -0,0 +1,89 @@
+# Header
+import random
+import time
+from functools import wraps
+from flask import request, g, has_request_context, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+"""
+Read/write splitting.
+
+Every URL in DATABASE_REPLICA_URLS (or every host in MYSQL_REPLICA_HOSTS)
+becomes a "replicaN" bind. A GET or HEAD request picks one replica and
+reads from it; any other request, the writes of a GET, SELECT ... FOR UPDATE
+and everything outside a request (intake workers, CLI commands) use the
+primary.
+
+Read your writes: a request that wrote to the primary sets the
+"read_primary" cookie for REPLICA_STICKY_SECONDS, and the client's GETs go
+to the primary until it expires, so it sees its own changes even while the
+replicas lag. The ETag counters (conditional.py, table_version) are bumped
+after the rows they count are committed, replicate after them and are read
+in the same session before the view runs, so a lagging replica answers with
+its own, older ETag and never pairs the previous body with the new one. Status endpoints that poll a
+background job (intake, exports) read from the primary with @use_primary.
+
+Try it locally with two SQLite files standing in for primary and replica:
+DATABASE_URL=sqlite:////tmp/primary.db DATABASE_REPLICA_URLS=sqlite:////tmp/replica.db \
+    flask --app "main:create_app()" run
+"""
+
+READ_METHODS = ('GET', 'HEAD')
+COOKIE = 'read_primary'
+
+
+def replica_binds(config):
+    return [key for key in config.get('SQLALCHEMY_BINDS') or {} if key.startswith('replica')]
+
+
+def is_write(session, clause):
+    return (
+        session._flushing
+        or isinstance(clause, UpdateBase)
+        or getattr(clause, '_for_update_arg', None) is not None
+    )
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if is_write(self, clause) or request.method not in READ_METHODS:
+                g.db_wrote = True
+            elif g.get('db_replica'):
+                return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_primary(view):
+    """Read from the primary in a GET handler that also writes, or that needs fresh data."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_replica = None
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def sticky():
+    try:
+        return float(request.cookies.get(COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def choose_replica():
+    replicas = replica_binds(current_app.config)
+    if replicas and request.method in READ_METHODS and not sticky():
+        g.db_replica = random.choice(replicas)
+
+
+def remember_write(response):
+    if g.pop('db_wrote', False) and replica_binds(current_app.config):
+        seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(COOKIE, str(round(time.time() + seconds, 3)), max_age=seconds, httponly=True)
+    return response
+
+
+def init_app(app):
+    app.before_request(choose_replica)
+    app.after_request(remember_write)
@@ -0,0 +1,69 @@
+# Header
+import datetime
+import json
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import fields
+from sqlalchemy import inspect
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+Fast JSON path for the list endpoints.
+
+Schemas whose fields are all plain columns (Int, Str, Date, ...) are served
+from Core rows: pagination.py selects just those columns and builds the
+objects with dict(zip(names, row)) instead of loading ORM instances and
+running Schema.dump field by field. Responses are encoded with orjson when
+it is installed (the json module otherwise), dates as ISO 8601 like
+Marshmallow, keys sorted like Flask's jsonify.
+Schemas with nested or computed fields keep using Schema.dump.
+"""
+
+# Fields (and subclasses such as Email) that dump the column value unchanged, or the ISO
+# string the encoder writes for dates; a custom date format needs Schema.dump
+PLAIN_FIELDS = (fields.Integer, fields.String, fields.Boolean, fields.Float, fields.Date, fields.DateTime)
+
+
+def plain_columns(schema, entity):
+    """[(name, column)] for the fields the schema would dump, or None if one needs Schema.dump."""
+    attrs = inspect(entity).column_attrs
+    columns = []
+    for name, field in sorted(schema.dump_fields.items()):
+        key = field.attribute or name
+        if not isinstance(field, PLAIN_FIELDS) or getattr(field, 'format', None) or key not in attrs:
+            return None
+        columns.append((field.data_key or name, getattr(entity, key)))
+    return columns
+
+
+def iso_default(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=iso_default, sort_keys=True, separators=(',', ':')).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    """jsonify() through orjson when available; dates as ISO 8601 either way."""
+
+    def default(self, value):
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return DefaultJSONProvider.default(value)
+
+    def dumps(self, obj, **kwargs):
+        # response() only asks for compact separators, or indent in debug mode
+        if orjson is None or set(kwargs) - {'separators', 'indent'}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
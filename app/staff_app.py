@@ -1,9 +1,16 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import exists, recheck
+from pagination import paginate
+from conditional import conditional
+from expand import ExpandError, expand
 from marshmallow import Schema, fields
 from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship
 from supplier_app import Supplier
+from changes import log_cascade
 
 staff_bp = Blueprint('staff_bp', __name__)
 
@@ -16,6 +23,7 @@ class Staff(db.Model):
     stf_tasks = Column(String(100), nullable=False)
     stf_role = Column(String(100), nullable=False)
     sup_id = Column(Integer, ForeignKey('supplier.sup_id', ondelete='CASCADE'), nullable=False)
+    supplier = relationship(Supplier, viewonly=True)
 
 # Marshmallow Schema
 class StaffSchema(Schema):
@@ -25,32 +33,42 @@ class StaffSchema(Schema):
     stf_tasks = fields.Str(required=True)
     stf_role = fields.Str(required=True)
     sup_id = fields.Int(required=True)
+    supplier = fields.Nested('SupplierSchema', dump_only=True)
 
-staff_schema = StaffSchema()
-staffs_schema = StaffSchema(many=True)
+# ?expand= name -> (schema field, relationship path)
+STAFF_EXPAND = {'supplier': ('supplier', 'supplier')}
+
+staff_schema = StaffSchema(exclude=('supplier',))
+staffs_schema = StaffSchema(many=True, exclude=('supplier',))
 
 # Endpoints (CRUD)
 """
 -> GET all staff
 curl http://localhost:5000/staff
+curl "http://localhost:5000/staff?expand=supplier"
 """
 @staff_bp.route('/staff', methods=['GET'])
+@conditional('staff', expanded=('supplier',))
 def get_staff():
-    all_staff = Staff.query.all()
-    if not all_staff:
-        return jsonify({"Error": "No staff found"}), 404
-    return jsonify(staffs_schema.dump(all_staff)), 200
+    return paginate(Staff.query, staffs_schema, "No staff found",
+                    filters=('sup_id',), expand=STAFF_EXPAND)
 
 
 """
 -> GET one staff member
 # curl http://localhost:5000/staff/<staff_member_id>
+# curl "http://localhost:5000/staff/<staff_member_id>?expand=supplier"
 """
 @staff_bp.route('/staff/<int:stf_id>', methods=['GET'])
+@conditional('staff', expanded=('supplier',))
 def get_one_staff(stf_id):
-    staff = Staff.query.get(stf_id)
+    try:
+        query, _, hidden = expand(Staff.query, STAFF_EXPAND)
+    except ExpandError as e:
+        return jsonify({"Error": str(e)}), 400
+    staff = query.filter_by(stf_id=stf_id).first()
     if staff:
-        return jsonify(staff_schema.dump(staff)), 200
+        return jsonify(StaffSchema(exclude=hidden).dump(staff)), 200
     else:
         return jsonify({"Error": "Staff not found"}), 404
 
@@ -73,13 +91,20 @@ def add_staff():
     if errors:
         return jsonify({"Error": "Invalid data", "Details": errors}), 400
 
-    if not Supplier.query.get(data['sup_id']):
+    if not exists(Supplier, data['sup_id']):
         return jsonify({"Error": "Supplier not found"}), 404
     
     else:
         new_staff = Staff(**data)
         db.session.add(new_staff)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            # The supplier was deleted after it was cached
+            if recheck((Supplier, data['sup_id'], "Supplier not found")):
+                return jsonify({"Error": "Supplier not found"}), 404
+            raise
         return jsonify(staff_schema.dump(new_staff)), 201
 
 
@@ -110,10 +135,16 @@ def update_staff(stf_id):
     if 'stf_role' in data:
         staff.stf_role = data['stf_role']
     if 'sup_id' in data:
-        if not Supplier.query.get(data['sup_id']):
+        if not exists(Supplier, data['sup_id']):
             return jsonify({"Error": "Supplier not found"}), 404
         staff.sup_id = data['sup_id']
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if recheck((Supplier, data.get('sup_id'), "Supplier not found")):
+            return jsonify({"Error": "Supplier not found"}), 404
+        raise
     return jsonify(staff_schema.dump(staff)), 200
 
 
@@ -127,6 +158,7 @@ def delete_staff(stf_id):
     if not staff:
         return jsonify({"Error": "Staff not found"}), 404
     
+    log_cascade(Staff, stf_id)
     db.session.delete(staff)
     db.session.commit()
     return jsonify({"Message": "Staff Member deleted"}), 200
@@ -1,8 +1,12 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import exists, recheck
+from pagination import paginate
+from conditional import conditional
 from marshmallow import Schema, fields
-from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
 from event_app import Event
 from staff_app import Staff
 from venue_app import Venue
@@ -16,9 +20,13 @@ class StaffVenue(db.Model):
     ev_id = Column(Integer, ForeignKey('event.ev_id', ondelete='CASCADE'), nullable=False)
     stf_id = Column(Integer, ForeignKey('staff.stf_id', ondelete='CASCADE'), nullable=False)
     vn_id = Column(Integer, ForeignKey('venue.vn_id', ondelete='CASCADE'), nullable=False)
+    event = relationship(Event, viewonly=True)
+    staff = relationship(Staff, viewonly=True)
+    venue = relationship(Venue, viewonly=True)
 
     __table_args__ = (
         UniqueConstraint('ev_id', 'stf_id', 'vn_id', name='unique_assignment'),
+        Index('idx_staff_venue_venue', 'vn_id'),
     )
 
 # Marshmallow Schema
@@ -27,21 +35,33 @@ class StaffVenueSchema(Schema):
     ev_id = fields.Int(required=True)
     stf_id = fields.Int(required=True)
     vn_id = fields.Int(required=True)
-
-staff_venue_schema = StaffVenueSchema()
-staff_venues_schema = StaffVenueSchema(many=True)
+    event = fields.Nested('EventSchema', exclude=('venues', 'staff'), dump_only=True)
+    staff = fields.Nested('StaffSchema', dump_only=True)
+    venue = fields.Nested('VenueSchema', exclude=('events',), dump_only=True)
+
+# ?expand= name -> (schema field, relationship path)
+STAFF_VENUE_EXPAND = {
+    'event': ('event', 'event'),
+    'staff': ('staff', 'staff'),
+    'supplier': ('staff.supplier', 'staff.supplier'),
+    'venue': ('venue', 'venue'),
+}
+STAFF_VENUE_RELATED = ('event', 'staff', 'supplier', 'venue')
+
+staff_venue_schema = StaffVenueSchema(exclude=('event', 'staff', 'venue'))
+staff_venues_schema = StaffVenueSchema(many=True, exclude=('event', 'staff', 'venue'))
 
 # Endpoints (CRUD)
 """
 -> GET: Retrieve all staff assigned to venue entries
 curl http://localhost:5000/staff_venue
+curl "http://localhost:5000/staff_venue?expand=event,staff,supplier,venue"
 """
 @staff_venue_bp.route('/staff_venue', methods=['GET'])
+@conditional('staff_venue', expanded=STAFF_VENUE_RELATED)
 def get_staff_venue():
-    all_records = StaffVenue.query.all()
-    if not all_records:
-        return jsonify({"Error": "Assigned Staff not found"}), 404
-    return jsonify(staff_venues_schema.dump(all_records)), 200
+    return paginate(StaffVenue.query, staff_venues_schema, "Assigned Staff not found",
+                    filters=('ev_id', 'stf_id', 'vn_id'), expand=STAFF_VENUE_EXPAND)
 
 
 """
@@ -49,11 +69,11 @@ def get_staff_venue():
 curl http://localhost:5000/staff_venue/<venue_id>
 """
 @staff_venue_bp.route('/staff_venue/<int:vn_id>', methods=['GET'])
+@conditional('staff_venue', expanded=STAFF_VENUE_RELATED)
 def get_staff_by_venue(vn_id):
-    records = StaffVenue.query.filter_by(vn_id=vn_id).all()
-    if not records:
-        return jsonify({"Error": "Staff-Venue assignment not found"}), 404
-    return jsonify(staff_venues_schema.dump(records)), 200
+    records = StaffVenue.query.filter_by(vn_id=vn_id)
+    return paginate(records, staff_venues_schema, "Staff-Venue assignment not found",
+                    filters=('ev_id', 'stf_id'), expand=STAFF_VENUE_EXPAND)
 
 
 """
@@ -73,11 +93,11 @@ def add_staff_venue():
     if errors:
         return jsonify({"Error": "Invalid data", "details": errors}), 400
     
-    if not Event.query.get(data['ev_id']):
+    if not exists(Event, data['ev_id']):
         return jsonify({'Error': 'Event not found'}), 404
     if not Staff.query.get(data['stf_id']):
         return jsonify({'Error': 'Staff not found'}), 404
-    if not Venue.query.get(data['vn_id']):
+    if not exists(Venue, data['vn_id']):
         return jsonify({'Error': 'Venue not found'}), 404
 
     new_record = StaffVenue(
@@ -90,6 +110,10 @@ def add_staff_venue():
         db.session.commit()
     except Exception as e:
         db.session.rollback()
+        # The event or venue was deleted after it was cached
+        missing = recheck((Event, data['ev_id'], 'Event not found'), (Venue, data['vn_id'], 'Venue not found'))
+        if missing:
+            return jsonify({'Error': missing}), 404
         return jsonify({"error": str(e)}), 400
     return jsonify(staff_venue_schema.dump(new_record)), 201
 
@@ -114,13 +138,13 @@ def update_staff_venue(sv_id):
     stf_id = data.get('stf_id')
     vn_id = data.get('vn_id')
 
-    if ev_id and not Event.query.get(ev_id):
+    if ev_id and not exists(Event, ev_id):
         return jsonify({'Error': 'Event not found'}), 404
 
     if stf_id and not Staff.query.get(stf_id):
         return jsonify({'Error': 'Staff not found'}), 404
 
-    if vn_id and not Venue.query.get(vn_id):
+    if vn_id and not exists(Venue, vn_id):
         return jsonify({'Error': 'Venue not found'}), 404
 
     if ev_id:
@@ -134,6 +158,9 @@ def update_staff_venue(sv_id):
         db.session.commit()
     except Exception as e:
         db.session.rollback()
+        missing = recheck((Event, ev_id or None, 'Event not found'), (Venue, vn_id or None, 'Venue not found'))
+        if missing:
+            return jsonify({'Error': missing}), 404
         return jsonify({"error": str(e)}), 400
     return jsonify(staff_venue_schema.dump(record)), 200
 
@@ -0,0 +1,115 @@
+# Header
+from flask import Blueprint, request, jsonify
+from use_db import db
+from cache import exists
+from conditional import conditional
+from marshmallow import ValidationError, fields
+from sqlalchemy import select, func
+from event_app import Event
+from rollup import EventSalesRollup, sales_query, rebuild
+
+stats_bp = Blueprint('stats_bp', __name__)
+
+DIMENSIONS = ('tic_type', 'tic_status_id', 'purchase_type', 'purchase_date')
+
+
+class StatsError(ValueError):
+    pass
+
+
+def parse_group_by(allowed, default):
+    group_by = request.args.get('group_by')
+    if not group_by:
+        return list(default)
+    names = [name.strip() for name in group_by.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise StatsError(f"Cannot group by: {', '.join(unknown)}")
+    return names
+
+
+def parse_date(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return fields.Date().deserialize(value)
+    except ValidationError:
+        raise StatsError(f"{name} must be a date (year-month-day)")
+
+
+def sales_stats(dimensions, ev_id=None):
+    """Tickets sold grouped by the given dimensions, from the rollup or (?live=1) from purchase/ticket."""
+    if request.args.get('live') in ('1', 'true'):
+        source = sales_query().subquery()
+    else:
+        source = EventSalesRollup.__table__
+    columns = [source.c[name] for name in dimensions]
+    sold = func.sum(source.c.sold)
+    stmt = select(*columns, sold.label('sold')).group_by(*columns).having(sold > 0).order_by(*columns)
+
+    if ev_id is not None:
+        stmt = stmt.where(source.c.ev_id == ev_id)
+    date_from, date_to = parse_date('from'), parse_date('to')
+    if date_from:
+        stmt = stmt.where(source.c.purchase_date >= date_from)
+    if date_to:
+        stmt = stmt.where(source.c.purchase_date <= date_to)
+
+    groups = []
+    for row in db.session.execute(stmt):
+        group = dict(row._mapping)
+        if 'purchase_date' in group:
+            group['purchase_date'] = group['purchase_date'].isoformat()
+        group['sold'] = int(group['sold'])
+        groups.append(group)
+    return {"total": sum(group['sold'] for group in groups), "groups": groups}
+
+
+# Endpoints
+"""
+-> GET tickets sold for one event, by ticket type, status, purchase type and day
+Options: group_by=<comma separated subset of tic_type,tic_status_id,purchase_type,purchase_date>,
+from=<year-month-day>, to=<year-month-day>, live=1 (aggregate purchase/ticket instead of the rollup)
+curl "http://localhost:5000/events/<event_id>/stats?group_by=tic_type,purchase_type"
+"""
+@stats_bp.route('/events/<int:ev_id>/stats', methods=['GET'])
+@conditional('event_sales_rollup', 'purchase', 'ticket')
+def get_event_stats(ev_id):
+    if not exists(Event, ev_id):
+        return jsonify({"Error": "Event not found"}), 404
+    try:
+        dimensions = parse_group_by(DIMENSIONS, DIMENSIONS)
+        stats = sales_stats(dimensions, ev_id)
+    except StatsError as e:
+        return jsonify({"Error": str(e)}), 400
+    return jsonify({"ev_id": ev_id, **stats}), 200
+
+
+"""
+-> GET tickets sold for all events (grouped by ev_id unless group_by says otherwise)
+curl "http://localhost:5000/events/stats?group_by=ev_id,tic_type"
+"""
+@stats_bp.route('/events/stats', methods=['GET'])
+@conditional('event_sales_rollup', 'purchase', 'ticket')
+def get_all_event_stats():
+    try:
+        dimensions = parse_group_by(('ev_id',) + DIMENSIONS, ('ev_id',))
+        stats = sales_stats(dimensions)
+    except StatsError as e:
+        return jsonify({"Error": str(e)}), 400
+    return jsonify(stats), 200
+
+
+"""
+-> POST rebuild the rollup from purchase/ticket (all events, or one with ?ev_id=<event_id>)
+curl -X POST http://localhost:5000/events/stats/rebuild
+"""
+@stats_bp.route('/events/stats/rebuild', methods=['POST'])
+def rebuild_stats():
+    ev_id = request.args.get('ev_id', type=int)
+    if ev_id is not None and not exists(Event, ev_id):
+        return jsonify({"Error": "Event not found"}), 404
+    rebuild(ev_id)
+    db.session.commit()
+    return jsonify({"Message": "Sales rollup rebuilt"}), 200
@@ -1,8 +1,13 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import invalidate
+from pagination import paginate
+from conditional import conditional
 from marshmallow import Schema, fields, validate
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index
+from sqlalchemy.exc import IntegrityError
+from changes import log_cascade
 
 supplier_bp = Blueprint('supplier_bp', __name__)
 
@@ -14,6 +19,11 @@ class Supplier(db.Model):
     sup_contact_number = Column(String(10), nullable=False)
     sup_service_type = Column(String(100), nullable=False)
 
+    __table_args__ = (
+        Index('idx_company_name', 'sup_company_name', unique=True),
+        Index('idx_service_type', 'sup_service_type'),
+    )
+
 # Marshmallow Schema
 class SupplierSchema(Schema):
     sup_id = fields.Int(dump_only=True)
@@ -37,12 +47,10 @@ suppliers_schema = SupplierSchema(many=True)
 curl http://localhost:5000/suppliers
 """
 @supplier_bp.route('/suppliers', methods=['GET'])
+@conditional('supplier')
 def get_suppliers():
-    all_suppliers = Supplier.query.all()
-    if all_suppliers:
-        return jsonify(suppliers_schema.dump(all_suppliers)), 200
-    else:
-        return jsonify({"Error": "Supplier not found"}), 404
+    return paginate(Supplier.query, suppliers_schema, "Supplier not found",
+                    filters=('sup_service_type',))
 
 
 """
@@ -50,6 +58,7 @@ def get_suppliers():
 # curl http://localhost:5000/suppliers/<supplier_id>
 """
 @supplier_bp.route('/suppliers/<int:sup_id>', methods=['GET'])
+@conditional('supplier')
 def get_supplier(sup_id):
     supplier = Supplier.query.get(sup_id)
     if supplier: 
@@ -85,7 +94,12 @@ def add_supplier():
             sup_service_type=data['sup_service_type']
         )
         db.session.add(new_supplier)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Same name created by a concurrent request (idx_company_name)
+            db.session.rollback()
+            return jsonify({"Error": "Company already exist"}), 409
         return jsonify(supplier_schema.dump(new_supplier)), 201
 
 
@@ -108,6 +122,9 @@ def update_supplier(sup_id):
         return jsonify({"Error": "Invalid data", "Details": errors}), 400
 
     if 'sup_company_name' in data:
+        if data['sup_company_name'] != supplier.sup_company_name:
+            if Supplier.query.filter_by(sup_company_name=data['sup_company_name']).first():
+                return jsonify({"Error": "Company already exist"}), 409
         supplier.sup_company_name = data['sup_company_name']
 
     if 'sup_contact_number' in data:
@@ -116,7 +133,12 @@ def update_supplier(sup_id):
     if 'sup_service_type' in data:
         supplier.sup_service_type = data['sup_service_type']
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"Error": "Company already exist"}), 409
+    invalidate(Supplier, sup_id)
     return jsonify(supplier_schema.dump(supplier)), 200
 
 
@@ -131,6 +153,8 @@ def delete_supplier(sup_id):
     if not supplier:
         return jsonify({"Error": "Supplier not found"}), 404
     
+    log_cascade(Supplier, sup_id)
     db.session.delete(supplier)
     db.session.commit()
+    invalidate(Supplier, sup_id)
     return jsonify({"Message": "Supplier deleted"}), 200
@@ -1,21 +1,37 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import exists, recheck
+from pagination import paginate
+from conditional import conditional
 from marshmallow import Schema, fields, validate
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, Enum, ForeignKey, Index, insert
+from sqlalchemy.exc import IntegrityError
 from event_app import Event
 from ticket_status_app import TicketStatus
+from rollup import record, sales_of, forget_ticket
+from inventory import SoldOut, reserve, release, release_sold
+from changes import log_changes, inserted_ids, log_cascade
 
 ticket_bp = Blueprint('ticket_bp', __name__)
 
+MINT_LIMIT = 100000
+MINT_CHUNK = 1000
+
 # SQLAlchemy Model
 class Ticket(db.Model):
     __tablename__ = 'ticket'
     tic_id = Column(Integer, primary_key=True)
-    tic_type = Column(String(10), nullable=False)
+    tic_type = Column(Enum('VIP', 'General', 'Premium'), nullable=False)
     tic_status_id = Column(Integer, ForeignKey('ticket_status.tic_status_id', onupdate='CASCADE'), nullable=False)
     ev_id = Column(Integer, ForeignKey('event.ev_id', ondelete='CASCADE'), nullable=False)
 
+    __table_args__ = (
+        Index('idx_ticket_status', 'tic_status_id'),
+        # ?tic_type= pages, in keyset order
+        Index('idx_ticket_type', 'tic_type', 'tic_id'),
+    )
+
 # Marshmallow Schema
 class TicketSchema(Schema):
     tic_id = fields.Int(dump_only=True)
@@ -26,8 +42,24 @@ class TicketSchema(Schema):
     tic_status_id = fields.Int(required=True)
     ev_id = fields.Int(required=True)
 
+class TicketBatchSchema(Schema):
+    tic_type = fields.Str(
+        required=True,
+        validate=validate.OneOf(['VIP', 'General', 'Premium'])
+    )
+    count = fields.Int(required=True, validate=validate.Range(min=1))
+
+class TicketMintSchema(Schema):
+    tic_status_id = fields.Int(required=True)
+    tickets = fields.List(
+        fields.Nested(TicketBatchSchema),
+        required=True,
+        validate=validate.Length(min=1)
+    )
+
 ticket_schema = TicketSchema()
 tickets_schema = TicketSchema(many=True)
+ticket_mint_schema = TicketMintSchema()
 
 # Endpoints (CRUD)
 """
@@ -35,11 +67,10 @@ tickets_schema = TicketSchema(many=True)
 curl http://localhost:5000/tickets
 """
 @ticket_bp.route('/tickets', methods=['GET'])
+@conditional('ticket')
 def get_tickets():
-    all_tickets = Ticket.query.all()
-    if not all_tickets:
-        return jsonify({"Error": "Tickets not found"}), 404
-    return jsonify(tickets_schema.dump(all_tickets)), 200
+    return paginate(Ticket.query, tickets_schema, "Tickets not found",
+                    filters=('ev_id', 'tic_status_id', 'tic_type'))
 
 
 """
@@ -47,6 +78,7 @@ def get_tickets():
 # curl http://localhost:5000/tickets/<ticket_id>
 """
 @ticket_bp.route('/tickets/<int:tic_id>', methods=['GET'])
+@conditional('ticket')
 def get_ticket(tic_id):
     ticket = Ticket.query.get(tic_id)
     if not ticket:
@@ -71,9 +103,9 @@ def add_ticket():
     if errors:
         return jsonify({"Error": "Invalid data", "details": errors}), 400
     
-    if not Event.query.get(data['ev_id']):
+    if not exists(Event, data['ev_id']):
         return jsonify({"Error": "Event not found"}), 404
-    if not TicketStatus.query.get(data['tic_status_id']):
+    if not exists(TicketStatus, data['tic_status_id']):
         return jsonify({"Error": "Ticket status not found"}), 404
     
     new_ticket = Ticket(
@@ -82,10 +114,74 @@ def add_ticket():
         ev_id=data['ev_id']
     )
     db.session.add(new_ticket)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # The event or status was deleted after it was cached
+        missing = recheck((Event, data['ev_id'], "Event not found"),
+                          (TicketStatus, data['tic_status_id'], "Ticket status not found"))
+        if missing:
+            return jsonify({"Error": missing}), 404
+        raise
     return jsonify(ticket_schema.dump(new_ticket)), 201
 
 
+"""
+-> POST mint many tickets for an event
+curl -X POST http://localhost:5000/events/<event_id>/tickets/bulk \
+    -H "Content-Type: application/json" \
+    -d '{
+            "tic_status_id": <status_ticket>,
+            "tickets": [{"tic_type": "<ticket_type>", "count": <amount>}, ...]
+        }'
+Tickets are written with multi-row INSERTs of MINT_CHUNK rows; the response lists the tic_id range of every chunk.
+"""
+@ticket_bp.route('/events/<int:ev_id>/tickets/bulk', methods=['POST'])
+def mint_tickets(ev_id):
+    data = request.json
+    errors = ticket_mint_schema.validate(data)
+    if errors:
+        return jsonify({"Error": "Invalid data", "details": errors}), 400
+
+    batches = ticket_mint_schema.load(data)['tickets']
+    total = sum(batch['count'] for batch in batches)
+    if total > MINT_LIMIT:
+        return jsonify({"Error": f"At most {MINT_LIMIT} tickets per request"}), 413
+
+    if not exists(Event, ev_id):
+        return jsonify({"Error": "Event not found"}), 404
+    if not exists(TicketStatus, data['tic_status_id']):
+        return jsonify({"Error": "Ticket status not found"}), 404
+
+    ranges = []
+    try:
+        for batch in batches:
+            remaining = batch['count']
+            while remaining:
+                size = min(remaining, MINT_CHUNK)
+                row = {"tic_type": batch['tic_type'], "tic_status_id": data['tic_status_id'], "ev_id": ev_id}
+                result = db.session.execute(insert(Ticket).values([row] * size))
+                ids = inserted_ids(result, size)
+                first, last = ids[0], ids[-1]
+                log_changes('ticket', ids, 'insert')
+                if ranges and ranges[-1]['tic_type'] == batch['tic_type'] and ranges[-1]['last_tic_id'] + 1 == first:
+                    ranges[-1]['last_tic_id'] = last
+                    ranges[-1]['count'] += size
+                else:
+                    ranges.append({"tic_type": batch['tic_type'], "first_tic_id": first, "last_tic_id": last, "count": size})
+                remaining -= size
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        missing = recheck((Event, ev_id, "Event not found"),
+                          (TicketStatus, data['tic_status_id'], "Ticket status not found"))
+        if missing:
+            return jsonify({"Error": missing}), 404
+        raise
+    return jsonify({"ev_id": ev_id, "created": total, "ranges": ranges}), 201
+
+
 """
 -> PUT update ticket status or type
 curl -X PUT http://localhost:5000/tickets/<ticket_id> \
@@ -103,14 +199,34 @@ def update_ticket(tic_id):
     if errors:
         return jsonify({"Error": "Invalid data", "details": errors}), 400
     
-    if 'tic_type' in data:
+    if 'tic_status_id' in data and not exists(TicketStatus, data['tic_status_id']):
+        return jsonify({"Error": "Ticket status not found"}), 404
+
+    # Move this ticket's sales to its new type/status in the rollup
+    sold = sales_of(Ticket.tic_id == tic_id) if 'tic_type' in data or 'tic_status_id' in data else {}
+    record(sold, sign=-1)
+    if 'tic_type' in data and data['tic_type'] != ticket.tic_type:
+        # Sold seats move to the new type's counter
+        seats = sum(sold.values())
+        if seats:
+            try:
+                reserve(ticket.ev_id, data['tic_type'], seats)
+            except SoldOut as e:
+                db.session.rollback()
+                return jsonify({"Error": str(e)}), 409
+            release(ticket.ev_id, ticket.tic_type, seats)
         ticket.tic_type = data['tic_type']
     if 'tic_status_id' in data:
-        if not TicketStatus.query.get(data['tic_status_id']):
-            return jsonify({"Error": "Ticket status not found"}), 404
         ticket.tic_status_id = data['tic_status_id']
-        
-    db.session.commit()
+    record({(ticket.ev_id, ticket.tic_type, ticket.tic_status_id) + key[3:]: count for key, count in sold.items()})
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if recheck((TicketStatus, data.get('tic_status_id'), "Ticket status not found")):
+            return jsonify({"Error": "Ticket status not found"}), 404
+        raise
     return jsonify(ticket_schema.dump(ticket)), 200
 
 
@@ -124,6 +240,8 @@ def delete_ticket(tic_id):
     if not ticket:
         return jsonify({"Error": "Ticket not found"}), 404
     
+    release_sold(forget_ticket(tic_id))
+    log_cascade(Ticket, tic_id)
     db.session.delete(ticket)
     db.session.commit()
     return jsonify({"Message": "Ticket deleted"}), 200
\ No newline at end of file
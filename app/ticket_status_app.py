@@ -1,6 +1,9 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import invalidate
+from pagination import paginate
+from conditional import conditional
 from marshmallow import Schema, fields
 from sqlalchemy import Column, Integer, String
 
@@ -26,11 +29,9 @@ statuses_schema = TicketStatusSchema(many=True)
 curl http://localhost:5000/ticket_statuses
 """
 @ticket_status_bp.route('/ticket_statuses', methods=['GET'])
+@conditional('ticket_status')
 def get_ticket_statuses():
-    statuses = TicketStatus.query.all()
-    if not statuses:
-        return jsonify({"Error": "No ticket statuses found"}), 404
-    return jsonify(statuses_schema.dump(statuses)), 200
+    return paginate(TicketStatus.query, statuses_schema, "No ticket statuses found")
 
 
 
@@ -39,6 +40,7 @@ def get_ticket_statuses():
 # curl http://localhost:5000/ticket_statuses/<status_ticket_id>
 """
 @ticket_status_bp.route('/ticket_statuses/<int:tic_status_id>', methods=['GET'])
+@conditional('ticket_status')
 def get_ticket_status(tic_status_id):
     status = TicketStatus.query.get(tic_status_id)
     if status:
@@ -89,6 +91,7 @@ def update_ticket_status(tic_status_id):
     if 'description' in data:
         status.description = data['description']
     db.session.commit()
+    invalidate(TicketStatus, tic_status_id)
     return jsonify(ticket_status_schema.dump(status)), 200
 
 
@@ -103,4 +106,5 @@ def delete_ticket_status(tic_status_id):
         return jsonify({"Error": "Status not found"}), 404
     db.session.delete(status)
     db.session.commit()
+    invalidate(TicketStatus, tic_status_id)
     return jsonify({"Message": "Ticket status deleted"}), 200
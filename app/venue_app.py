@@ -1,8 +1,15 @@
 # Header
 from flask import Blueprint, request, jsonify
 from use_db import db
+from cache import invalidate
+from pagination import paginate
+from conditional import conditional
+from expand import ExpandError, expand
 from marshmallow import Schema, fields, validate
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Enum, Index
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship
+from changes import log_cascade
 
 venue_bp = Blueprint('venue_bp', __name__)
 
@@ -11,8 +18,15 @@ class Venue(db.Model):
     __tablename__ = 'venue'
     vn_id = Column(Integer, primary_key=True)
     vn_name = Column(String(100), nullable=False)
-    vn_type = Column(String(10), nullable=False)
+    vn_type = Column(Enum('VIP', 'General', 'Premium'), nullable=False)
     vn_capacity = Column(Integer, nullable=False)
+    events = relationship('Event', secondary='event_venue', viewonly=True, order_by='Event.ev_id')
+
+    __table_args__ = (
+        Index('idx_vn_name', 'vn_name', unique=True),
+        # ?vn_type= pages, in keyset order
+        Index('idx_vn_type', 'vn_type', 'vn_id'),
+    )
 
 # Marshmallow Schema
 class VenueSchema(Schema):
@@ -27,32 +41,43 @@ class VenueSchema(Schema):
         validate=validate.Range(min=1)
     )
 
-venue_schema = VenueSchema()
-venues_schema = VenueSchema(many=True)
+    events = fields.Nested('EventSchema', many=True, exclude=('venues', 'staff'), dump_only=True)
+
+# ?expand= name -> (schema field, relationship path)
+VENUE_EXPAND = {'events': ('events', 'events')}
+
+venue_schema = VenueSchema(exclude=('events',))
+venues_schema = VenueSchema(many=True, exclude=('events',))
 
 # Endpoints (CRUD)
 """
 -> GET all venues
 curl http://localhost:5000/venues
+curl "http://localhost:5000/venues?expand=events"
 """
 @venue_bp.route('/venues', methods=['GET'])
+@conditional('venue', expanded=('event_venue', 'event'))
 def get_venues():
-    all_venues = Venue.query.all()
-    if not all_venues:
-        return jsonify({"Error": "No venues found"}), 404
-    return jsonify(venues_schema.dump(all_venues)), 200
+    return paginate(Venue.query, venues_schema, "No venues found",
+                    filters=('vn_type', 'vn_name'), expand=VENUE_EXPAND)
 
 
 
 """
 -> GET single Venue by ID
 # curl http://localhost:5000/venues/<venue_id>
+# curl "http://localhost:5000/venues/<venue_id>?expand=events"
 """
 @venue_bp.route('/venues/<int:vn_id>', methods=['GET'])
+@conditional('venue', expanded=('event_venue', 'event'))
 def get_venue(vn_id):
-    venue = Venue.query.get(vn_id)
+    try:
+        query, _, hidden = expand(Venue.query, VENUE_EXPAND)
+    except ExpandError as e:
+        return jsonify({"Error": str(e)}), 400
+    venue = query.filter_by(vn_id=vn_id).first()
     if venue:
-        return jsonify(venue_schema.dump(venue)), 200
+        return jsonify(VenueSchema(exclude=hidden).dump(venue)), 200
     else:
         return jsonify({"Error": "Venue not found"}), 404
 
@@ -84,7 +109,12 @@ def add_venue():
             vn_capacity=data['vn_capacity']
         )
         db.session.add(new_venue)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Same name created by a concurrent request (idx_vn_name)
+            db.session.rollback()
+            return jsonify({"Error": "Venue already exists"}), 409
         return jsonify(venue_schema.dump(new_venue)), 201
 
 
@@ -118,7 +148,12 @@ def update_venue(vn_id):
     if 'vn_capacity' in data:
         venue.vn_capacity = data['vn_capacity']
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"Error": "Venue name already exists"}), 409
+    invalidate(Venue, vn_id)
     return jsonify(venue_schema.dump(venue)), 200
 
 """
@@ -131,6 +166,8 @@ def delete_venue(vn_id):
     if not venue:
         return jsonify({"Error": "Venue not found"}), 404
     
+    log_cascade(Venue, vn_id)
     db.session.delete(venue)
     db.session.commit()
+    invalidate(Venue, vn_id)
     return jsonify({"message": "Venue deleted"}), 200
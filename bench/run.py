@@ -0,0 +1,242 @@
+# Header
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+"""
+Load generator: runs a weighted mix of requests at a fixed concurrency and
+reports throughput and p50/p95/p99 latency per endpoint.
+
+In process, through the Flask test client (no server, same DATABASE_URL as bench/seed.py):
+DATABASE_URL=sqlite:////tmp/bench.db python bench/run.py --concurrency 8 --duration 30
+Over HTTP, against gunicorn or the dev server:
+python bench/run.py --url http://localhost:5000 --concurrency 32 --duration 60 --mix all
+
+Regression gate: save a run with --json, then compare later runs with it.
+python bench/run.py --json baseline.json
+python bench/run.py --baseline baseline.json --max-regression 0.15   (exit status 1 on regression)
+
+The "write" and "all" mixes need MySQL: the write handlers pass dates as
+strings, which SQLite's Date type rejects.
+"""
+
+PURCHASE_TYPES = ('Online', 'Mobile App', 'Box Office')
+
+
+def read_mix(ids):
+    return [
+        ('GET /events', 10, lambda rng: ('GET', '/events?limit=50', None)),
+        ('GET /events/<id>?expand', 10, lambda rng: (
+            'GET', f"/events/{rng.randint(*ids['event'])}?expand=venues,staff,supplier", None)),
+        ('GET /attendees/<id>', 20, lambda rng: ('GET', f"/attendees/{rng.randint(*ids['attendee'])}", None)),
+        ('GET /tickets?ev_id', 20, lambda rng: ('GET', f"/tickets?ev_id={rng.randint(*ids['event'])}&limit=100", None)),
+        ('GET /purchases?att_id', 20, lambda rng: ('GET', f"/purchases?att_id={rng.randint(*ids['attendee'])}", None)),
+        ('GET /events/<id>/stats', 10, lambda rng: (
+            'GET', f"/events/{rng.randint(*ids['event'])}/stats?group_by=tic_type", None)),
+        ('GET /events/stats', 5, lambda rng: ('GET', '/events/stats', None)),
+    ]
+
+
+def write_mix(ids):
+    def purchase(rng):
+        day = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+        return ('POST', '/purchases', {
+            'att_id': rng.randint(*ids['attendee']), 'tic_id': rng.randint(*ids['ticket']),
+            'purchase_type': rng.choice(PURCHASE_TYPES), 'purchase_date': day.isoformat(),
+        })
+
+    def attendee_phone(rng):
+        phone = '09' + ''.join(rng.choice('0123456789') for _ in range(8))
+        return ('PUT', f"/attendees/{rng.randint(*ids['attendee'])}", {'att_phone': phone})
+
+    return [
+        ('POST /purchases', 10, purchase),
+        ('PUT /attendees/<id>', 5, attendee_phone),
+    ]
+
+
+MIXES = {
+    'read': read_mix,
+    'write': write_mix,
+    'all': lambda ids: read_mix(ids) + write_mix(ids),
+}
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.close()
+        return response.status_code, response.get_data()
+
+
+class HTTPClient:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+    def request(self, method, path, body):
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            return 0, b''
+
+
+def id_ranges(client):
+    """(first, last) id of each table, read through the API itself."""
+    ranges = {}
+    for name, path, key in (('event', '/events', 'ev_id'), ('attendee', '/attendees', 'att_id'),
+                            ('ticket', '/tickets', 'tic_id')):
+        bounds = []
+        for sort in (key, f'-{key}'):
+            status, body = client.request('GET', f"{path}?sort={sort}&limit=1&fields={key}", None)
+            if status != 200:
+                sys.exit(f"Cannot read {path} ({status}): seed the database first (bench/seed.py)")
+            bounds.append(json.loads(body)[0][key])
+        ranges[name] = tuple(bounds)
+    return ranges
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def worker(make_client, mix, deadline, seed, results, lock, warmup_until):
+    rng = random.Random(seed)
+    client = make_client()
+    names = [name for name, _, _ in mix]
+    weights = [weight for _, weight, _ in mix]
+    builders = {name: build for name, _, build in mix}
+    local = defaultdict(lambda: {'latencies': [], 'statuses': defaultdict(int)})
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, body = builders[name](rng)
+        start = time.perf_counter()
+        status, _ = client.request(method, path, body)
+        end = time.perf_counter()
+        if start < warmup_until:
+            continue
+        local[name]['latencies'].append(end - start)
+        local[name]['statuses'][status] += 1
+    with lock:
+        for name, result in local.items():
+            results[name]['latencies'] += result['latencies']
+            for status, count in result['statuses'].items():
+                results[name]['statuses'][status] += count
+
+
+def summarize(results, elapsed):
+    report = {'endpoints': {}, 'elapsed': round(elapsed, 3)}
+    total = 0
+    for name, result in sorted(results.items()):
+        latencies = sorted(result['latencies'])
+        total += len(latencies)
+        report['endpoints'][name] = {
+            'requests': len(latencies),
+            'errors': sum(count for status, count in result['statuses'].items() if status == 0 or status >= 500),
+            'statuses': {str(status): count for status, count in sorted(result['statuses'].items())},
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        }
+    report['requests'] = total
+    report['rps'] = round(total / elapsed, 2) if elapsed else 0.0
+    return report
+
+
+def print_report(report):
+    print(f"{'endpoint':<28}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for name, row in report['endpoints'].items():
+        print(f"{name:<28}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}  {row['statuses']}")
+    print(f"total: {report['requests']} requests in {report['elapsed']}s, {report['rps']} requests/s")
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    if report['rps'] < baseline['rps'] * (1 - tolerance):
+        found.append(f"throughput {report['rps']} < {baseline['rps']} requests/s")
+    for name, before in baseline['endpoints'].items():
+        after = report['endpoints'].get(name)
+        if after and after['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {after['p95_ms']} ms > {before['p95_ms']} ms")
+        if after and after['errors'] > before['errors']:
+            found.append(f"{name}: {after['errors']} errors (was {before['errors']})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fixed-concurrency benchmark")
+    parser.add_argument('--url', help="benchmark a running server instead of the in-process test client")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help="seconds, warmup included")
+    parser.add_argument('--warmup', type=float, default=3, help="seconds left out of the results")
+    parser.add_argument('--mix', choices=sorted(MIXES), default='read')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="write the report to this file")
+    parser.add_argument('--baseline', help="report from an earlier run to compare with")
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help="allowed p95/throughput regression against --baseline (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HTTPClient(args.url)
+    else:
+        from main import create_app
+        app = create_app()
+        make_client = lambda: TestClient(app)
+
+    mix = MIXES[args.mix](id_ranges(make_client()))
+    results = defaultdict(lambda: {'latencies': [], 'statuses': defaultdict(int)})
+    lock = threading.Lock()
+    start = time.perf_counter()
+    warmup_until = start + args.warmup
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(make_client, mix, deadline, args.seed + i, results, lock, warmup_until))
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = summarize(results, max(args.duration - args.warmup, 0.001))
+    report.update({'concurrency': args.concurrency, 'mix': args.mix, 'target': args.url or 'test-client'})
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.max_regression)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
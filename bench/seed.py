@@ -0,0 +1,156 @@
+# Header
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from sqlalchemy import func, select
+from use_db import db
+from main import create_app
+from rollup import rebuild
+
+"""
+Synthetic data for the benchmarks, at any scale, with a valid foreign key graph.
+Rows are appended after the current maximum ids, so it also runs on top of init.sql.
+
+SQLite stand-in (tables are created with --create-all):
+DATABASE_URL=sqlite:////tmp/bench.db python bench/seed.py --create-all --attendees 1000000 --tickets 2000000 --purchases 1500000
+Local MySQL container loaded with init.sql:
+MYSQL_HOST=127.0.0.1 MYSQL_PORT=3306 MYSQL_DATABASE=final_db MYSQL_USER=root MYSQL_PASSWORD=... python bench/seed.py
+
+The same --seed always generates the same rows.
+"""
+
+CHUNK = 10000
+TIC_TYPES = ('VIP', 'General', 'Premium')
+PURCHASE_TYPES = ('Online', 'Mobile App', 'Box Office')
+FIRST_DATE = datetime.date(2030, 1, 1)
+SALES_FROM = datetime.date(2024, 1, 1)
+
+
+def chunks(rows, size=CHUNK):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def next_id(table):
+    column = list(table.primary_key)[0]
+    return (db.session.scalar(select(func.max(column))) or 0) + 1
+
+
+def insert(name, rows, total):
+    table = db.metadata.tables[name]
+    start = time.perf_counter()
+    done = 0
+    for chunk in chunks(rows):
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        done += len(chunk)
+        print(f"\r{name}: {done}/{total}", end='', flush=True)
+    elapsed = time.perf_counter() - start
+    print(f"\r{name}: {done} rows in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+def phone(rng):
+    return '09' + ''.join(rng.choice('0123456789') for _ in range(8))
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    tables = db.metadata.tables
+
+    statuses = {1: 'Valid', 2: 'Expired', 3: 'Canceled'}
+    known = set(db.session.scalars(select(tables['ticket_status'].c.tic_status_id)))
+    insert('ticket_status', ({'tic_status_id': pk, 'description': description}
+                             for pk, description in statuses.items() if pk not in known), len(statuses) - len(known))
+
+    first = {name: next_id(tables[name]) for name in
+             ('event', 'venue', 'supplier', 'staff', 'attendee', 'ticket')}
+    last_date = db.session.scalar(select(func.max(tables['event'].c.ev_date)))
+    first_date = max(FIRST_DATE, last_date + datetime.timedelta(days=1)) if last_date else FIRST_DATE
+    events = range(first['event'], first['event'] + args.events)
+    venues = range(first['venue'], first['venue'] + args.venues)
+    suppliers = range(first['supplier'], first['supplier'] + args.suppliers)
+    staff = range(first['staff'], first['staff'] + args.staff)
+    attendees = range(first['attendee'], first['attendee'] + args.attendees)
+    tickets = range(first['ticket'], first['ticket'] + args.tickets)
+
+    insert('event', ({'ev_id': pk, 'ev_name': f"Event {pk}", 'ev_description': f"Benchmark event {pk}",
+                      'ev_date': first_date + datetime.timedelta(days=i)}
+                     for i, pk in enumerate(events)), len(events))
+    insert('venue', ({'vn_id': pk, 'vn_name': f"Venue {pk}", 'vn_type': rng.choice(TIC_TYPES),
+                      'vn_capacity': rng.randint(100, 5000)}
+                     for pk in venues), len(venues))
+
+    event_venues = {pk: rng.sample(venues, min(args.venues_per_event, len(venues))) for pk in events}
+    insert('event_venue', ({'ev_id': ev_id, 'vn_id': vn_id}
+                           for ev_id, vn_ids in event_venues.items() for vn_id in vn_ids),
+           len(events) * min(args.venues_per_event, len(venues)))
+
+    insert('supplier', ({'sup_id': pk, 'sup_company_name': f"Supplier {pk}", 'sup_contact_number': phone(rng),
+                         'sup_service_type': rng.choice(('Security', 'Catering', 'Cleaning', 'Sound'))}
+                        for pk in suppliers), len(suppliers))
+    insert('staff', ({'stf_id': pk, 'stf_name': f"Name{pk}", 'stf_last_name': f"Last{pk}",
+                      'stf_tasks': 'Benchmark', 'stf_role': 'Staff', 'sup_id': rng.choice(suppliers)}
+                     for pk in staff), len(staff))
+    assignments = {
+        (ev_id, stf_id, rng.choice(event_venues[ev_id]))
+        for ev_id in events if event_venues[ev_id]
+        for stf_id in rng.sample(staff, min(args.staff_per_event, len(staff)))
+    }
+    insert('staff_venue', ({'ev_id': ev_id, 'stf_id': stf_id, 'vn_id': vn_id}
+                           for ev_id, stf_id, vn_id in sorted(assignments)), len(assignments))
+
+    insert('attendee', ({'att_id': pk, 'att_name': f"Name{pk}", 'att_last_name': f"Last{pk}",
+                         'att_email': f"attendee{pk}@bench.example.com", 'att_phone': phone(rng)}
+                        for pk in attendees), len(attendees))
+    insert('ticket', ({'tic_id': pk, 'tic_type': rng.choice(TIC_TYPES),
+                       'tic_status_id': rng.choices((1, 2, 3), weights=(90, 5, 5))[0],
+                       'ev_id': rng.choice(events)}
+                      for pk in tickets), len(tickets))
+    # Every ticket is sold at most once, so (att_id, tic_id) never repeats
+    sold = tickets[:args.purchases]
+    insert('purchase', ({'att_id': rng.choice(attendees), 'tic_id': tic_id,
+                         'purchase_type': rng.choice(PURCHASE_TYPES),
+                         'purchase_date': SALES_FROM + datetime.timedelta(days=rng.randrange(365))}
+                        for tic_id in sold), len(sold))
+
+    start = time.perf_counter()
+    rebuild()
+    db.session.commit()
+    print(f"event_sales_rollup: rebuilt in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate benchmark data")
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--venues-per-event', type=int, default=2)
+    parser.add_argument('--suppliers', type=int, default=50)
+    parser.add_argument('--staff', type=int, default=2000)
+    parser.add_argument('--staff-per-event', type=int, default=5)
+    parser.add_argument('--attendees', type=int, default=100000)
+    parser.add_argument('--tickets', type=int, default=200000)
+    parser.add_argument('--purchases', type=int, default=150000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--create-all', action='store_true', help="create missing tables first (SQLite)")
+    args = parser.parse_args()
+    if args.purchases > args.tickets:
+        parser.error("--purchases cannot exceed --tickets")
+
+    app = create_app(create_all=args.create_all)
+    with app.app_context():
+        seed(args)
+
+
+if __name__ == '__main__':
+    main()
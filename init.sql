@@ -25,6 +25,8 @@ CREATE TABLE venue (
     vn_type ENUM('VIP', 'General', 'Premium') NOT NULL,
     vn_capacity INT NOT NULL,
     PRIMARY KEY (vn_id),
+    UNIQUE INDEX idx_vn_name (vn_name),
+    INDEX idx_vn_type (vn_type, vn_id),
     CONSTRAINT chk_capacity CHECK (vn_capacity > 0)
 ) ENGINE=InnoDB;
 
@@ -35,7 +37,8 @@ CREATE TABLE event_venue (
     vn_id INT NOT NULL,
     PRIMARY KEY (ev_ven_id),
     FOREIGN KEY (ev_id) REFERENCES event(ev_id) ON DELETE CASCADE,
-    FOREIGN KEY (vn_id) REFERENCES venue(vn_id) ON DELETE CASCADE
+    FOREIGN KEY (vn_id) REFERENCES venue(vn_id) ON DELETE CASCADE,
+    UNIQUE KEY unique_event_venue (ev_id, vn_id)
 ) ENGINE=InnoDB;
 
 
@@ -45,6 +48,7 @@ CREATE TABLE supplier (
     sup_contact_number VARCHAR(10) NOT NULL,
     sup_service_type VARCHAR(100) NOT NULL,
     PRIMARY KEY (sup_id),
+    UNIQUE INDEX idx_company_name (sup_company_name),
     INDEX idx_service_type (sup_service_type),
     CONSTRAINT chk_contact_number CHECK (sup_contact_number REGEXP '^09[0-9]{8}$')
 ) ENGINE=InnoDB;
@@ -71,7 +75,8 @@ CREATE TABLE staff_venue (
     FOREIGN KEY (stf_id) REFERENCES staff(stf_id) ON DELETE CASCADE,
     FOREIGN KEY (vn_id) REFERENCES venue(vn_id) ON DELETE CASCADE,
     FOREIGN KEY (ev_id) REFERENCES event(ev_id) ON DELETE CASCADE,
-    UNIQUE KEY unique_assignment (ev_id, stf_id, vn_id)
+    UNIQUE KEY unique_assignment (ev_id, stf_id, vn_id),
+    INDEX idx_staff_venue_venue (vn_id)
 ) ENGINE=InnoDB;
 
 CREATE TABLE attendee (
@@ -97,7 +102,8 @@ CREATE TABLE ticket (
     PRIMARY KEY (tic_id),
     FOREIGN KEY (tic_status_id) REFERENCES ticket_status(tic_status_id) ON UPDATE CASCADE,
     FOREIGN KEY (ev_id) REFERENCES event(ev_id) ON DELETE CASCADE,
-    INDEX idx_ticket_status (tic_status_id)
+    INDEX idx_ticket_status (tic_status_id),
+    INDEX idx_ticket_type (tic_type, tic_id)
 ) ENGINE=InnoDB;
 
 -- types of purchase: Web:Online, APP:Mobile app, Physical ticket:Box Office
@@ -108,9 +114,148 @@ CREATE TABLE purchase (
     tic_id INT NOT NULL,
     PRIMARY KEY (att_id, tic_id),
     FOREIGN KEY (att_id) REFERENCES attendee(att_id) ON DELETE CASCADE,
-    FOREIGN KEY (tic_id) REFERENCES ticket(tic_id) ON DELETE CASCADE
+    FOREIGN KEY (tic_id) REFERENCES ticket(tic_id) ON DELETE CASCADE,
+    INDEX idx_purchase_ticket (tic_id),
+    INDEX idx_purchase_date (purchase_date, att_id, tic_id),
+    INDEX idx_purchase_type (purchase_type, att_id, tic_id)
+) ENGINE=InnoDB;
+
+-- Tickets left per event and ticket type, built from the capacity of the event's venues
+CREATE TABLE ticket_inventory (
+    ev_id INT NOT NULL,
+    tic_type ENUM('VIP', 'General', 'Premium') NOT NULL,
+    capacity INT NOT NULL,
+    available INT NOT NULL,
+    PRIMARY KEY (ev_id, tic_type),
+    FOREIGN KEY (ev_id) REFERENCES event(ev_id) ON DELETE CASCADE,
+    CONSTRAINT chk_available CHECK (available >= 0)
+) ENGINE=InnoDB;
+
+-- Seats held for a buyer until expires_at
+CREATE TABLE ticket_hold (
+    hold_id INT NOT NULL AUTO_INCREMENT,
+    ev_id INT NOT NULL,
+    tic_type ENUM('VIP', 'General', 'Premium') NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (hold_id),
+    FOREIGN KEY (ev_id, tic_type) REFERENCES ticket_inventory(ev_id, tic_type) ON DELETE CASCADE,
+    INDEX idx_hold_expires (expires_at)
+) ENGINE=InnoDB;
+
+-- Tickets sold per event, ticket type, status, purchase type and day, kept current by the API (rollup.py)
+CREATE TABLE event_sales_rollup (
+    ev_id INT NOT NULL,
+    tic_type ENUM('VIP', 'General', 'Premium') NOT NULL,
+    tic_status_id INT NOT NULL,
+    purchase_type ENUM('Online', 'Mobile App', 'Box Office') NOT NULL,
+    purchase_date DATE NOT NULL,
+    sold INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ev_id, tic_type, tic_status_id, purchase_type, purchase_date),
+    FOREIGN KEY (ev_id) REFERENCES event(ev_id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Purchases accepted with POST /purchases?async=1, written in batches by the intake workers
+CREATE TABLE purchase_intake (
+    intake_id INT NOT NULL AUTO_INCREMENT,
+    payload TEXT NOT NULL,
+    status ENUM('queued', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    result TEXT NULL,
+    created_at DATETIME NOT NULL,
+    processed_at DATETIME NULL,
+    PRIMARY KEY (intake_id),
+    INDEX idx_intake_status (status, intake_id)
+) ENGINE=InnoDB;
+
+-- Change feed (GET /changes): one row per insert/update/delete, written in the same transaction;
+-- seq is set by app/changes.py relay() once the row is committed
+CREATE TABLE change_log (
+    change_id BIGINT NOT NULL AUTO_INCREMENT,
+    seq BIGINT NULL,
+    entity VARCHAR(30) NOT NULL,
+    pk VARCHAR(64) NOT NULL,
+    op ENUM('insert', 'update', 'delete') NOT NULL,
+    changed_at DATETIME NOT NULL,
+    PRIMARY KEY (change_id),
+    UNIQUE INDEX idx_change_seq (seq),
+    INDEX idx_change_entity (entity, seq),
+    INDEX idx_change_time (changed_at)
+) ENGINE=InnoDB;
+
+-- Last change_log seq given out; locked only by relay(), one relay at a time
+CREATE TABLE change_sequence (
+    id INT NOT NULL,
+    seq BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB;
+
+INSERT INTO change_sequence (id, seq) VALUES (1, 0);
+
+-- Progress of "flask import" runs (app/importer.py), committed with each batch
+CREATE TABLE import_checkpoint (
+    source VARCHAR(255) NOT NULL,
+    position BIGINT NOT NULL DEFAULT 0,
+    inserted BIGINT NOT NULL DEFAULT 0,
+    rejected BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    PRIMARY KEY (source)
+) ENGINE=InnoDB;
+
+-- Analytics export jobs (POST /exports, app/export_worker.py)
+CREATE TABLE export_job (
+    job_id INT NOT NULL AUTO_INCREMENT,
+    kind VARCHAR(20) NOT NULL,
+    format ENUM('csv', 'parquet') NOT NULL,
+    params TEXT NOT NULL,
+    status ENUM('queued', 'running', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    `rows` BIGINT NULL,
+    file VARCHAR(255) NULL,
+    error TEXT NULL,
+    created_at DATETIME NOT NULL,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    PRIMARY KEY (job_id),
+    INDEX idx_export_status (status, job_id)
 ) ENGINE=InnoDB;
 
+-- Responses kept for Idempotency-Key retries (app/idempotency.py); owner is set while the first request runs
+CREATE TABLE idempotency_key (
+    idem_key VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    owner VARCHAR(32) NULL,
+    status INT NULL,
+    body MEDIUMTEXT NULL,
+    headers TEXT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (idem_key),
+    INDEX idx_idempotency_expires (expires_at)
+) ENGINE=InnoDB;
+
+-- ETag / Last-Modified version counter of each table (app/conditional.py): the sum of its shards,
+-- one of which is bumped after every commit that wrote to the table
+CREATE TABLE table_version (
+    table_name VARCHAR(64) NOT NULL,
+    shard INT NOT NULL DEFAULT 0,
+    version BIGINT NOT NULL DEFAULT 0,
+    modified_at DATETIME NOT NULL,
+    PRIMARY KEY (table_name, shard)
+) ENGINE=InnoDB;
+
+-- Shard 0 of every table up front: its Last-Modified starts now
+INSERT INTO table_version (table_name, shard, version, modified_at)
+SELECT table_name, 0, 0, NOW() FROM information_schema.tables WHERE table_schema = DATABASE();
+
+-- Migrations (migrations/*.sql) this schema already includes, see app/migrate.py
+CREATE TABLE schema_migrations (
+    version VARCHAR(64) NOT NULL,
+    applied_at DATETIME NOT NULL,
+    PRIMARY KEY (version)
+) ENGINE=InnoDB;
+
+INSERT INTO schema_migrations (version, applied_at) VALUES ('0000', NOW()), ('0001', NOW()), ('0002', NOW()), ('0003', NOW()), ('0004', NOW()), ('0005', NOW()), ('0006', NOW()), ('0007', NOW()), ('0008', NOW()), ('0009', NOW());
+
 -- ============ UPLOAD DATA  ============ --
 
 START TRANSACTION;
@@ -331,5 +476,11 @@ INSERT INTO purchase (purchase_date, purchase_type, att_id, tic_id) VALUES
 ('2024-06-30', 'Online', 26, 26),
 ('2024-06-01', 'Mobile App', 27, 27);
 
+-- Sales rollup
+INSERT INTO event_sales_rollup (ev_id, tic_type, tic_status_id, purchase_type, purchase_date, sold)
+SELECT t.ev_id, t.tic_type, t.tic_status_id, p.purchase_type, p.purchase_date, COUNT(*)
+FROM purchase p JOIN ticket t ON t.tic_id = p.tic_id
+GROUP BY t.ev_id, t.tic_type, t.tic_status_id, p.purchase_type, p.purchase_date;
+
 COMMIT;
 
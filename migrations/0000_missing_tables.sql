@@ -0,0 +1,104 @@
+-- Tables init.sql gained without a migration of their own: a database made from the original
+-- init.sql (the ten entity tables) gets them here, before 0002 seeds table_version and 0003
+-- and 0006 alter change_log and export_job. They are created as they were before those
+-- migrations. IF NOT EXISTS leaves the ones a newer init.sql already made alone.
+
+-- Ticket counters (app/inventory.py); events without counter rows are not capacity managed
+CREATE TABLE IF NOT EXISTS ticket_inventory (
+    ev_id INT NOT NULL,
+    tic_type ENUM('VIP', 'General', 'Premium') NOT NULL,
+    capacity INT NOT NULL,
+    available INT NOT NULL,
+    PRIMARY KEY (ev_id, tic_type),
+    FOREIGN KEY (ev_id) REFERENCES event(ev_id) ON DELETE CASCADE,
+    CONSTRAINT chk_available CHECK (available >= 0)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS ticket_hold (
+    hold_id INT NOT NULL AUTO_INCREMENT,
+    ev_id INT NOT NULL,
+    tic_type ENUM('VIP', 'General', 'Premium') NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (hold_id),
+    FOREIGN KEY (ev_id, tic_type) REFERENCES ticket_inventory(ev_id, tic_type) ON DELETE CASCADE,
+    INDEX idx_hold_expires (expires_at)
+) ENGINE=InnoDB;
+
+-- Sales rollup (app/rollup.py), filled from the purchases already there
+-- (what POST /events/stats/rebuild does)
+CREATE TABLE IF NOT EXISTS event_sales_rollup (
+    ev_id INT NOT NULL,
+    tic_type ENUM('VIP', 'General', 'Premium') NOT NULL,
+    tic_status_id INT NOT NULL,
+    purchase_type ENUM('Online', 'Mobile App', 'Box Office') NOT NULL,
+    purchase_date DATE NOT NULL,
+    sold INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ev_id, tic_type, tic_status_id, purchase_type, purchase_date),
+    FOREIGN KEY (ev_id) REFERENCES event(ev_id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO event_sales_rollup (ev_id, tic_type, tic_status_id, purchase_type, purchase_date, sold)
+SELECT ticket.ev_id, ticket.tic_type, ticket.tic_status_id, purchase.purchase_type, purchase.purchase_date, COUNT(*)
+FROM purchase JOIN ticket ON ticket.tic_id = purchase.tic_id
+GROUP BY ticket.ev_id, ticket.tic_type, ticket.tic_status_id, purchase.purchase_type, purchase.purchase_date;
+
+-- POST /purchases?async=1 queue (app/intake_worker.py)
+CREATE TABLE IF NOT EXISTS purchase_intake (
+    intake_id INT NOT NULL AUTO_INCREMENT,
+    payload TEXT NOT NULL,
+    status ENUM('queued', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    result TEXT NULL,
+    created_at DATETIME NOT NULL,
+    processed_at DATETIME NULL,
+    PRIMARY KEY (intake_id),
+    INDEX idx_intake_status (status, intake_id)
+) ENGINE=InnoDB;
+
+-- Change feed (app/changes.py); 0003 takes seq off AUTO_INCREMENT
+CREATE TABLE IF NOT EXISTS change_log (
+    seq BIGINT NOT NULL AUTO_INCREMENT,
+    entity VARCHAR(30) NOT NULL,
+    pk VARCHAR(64) NOT NULL,
+    op ENUM('insert', 'update', 'delete') NOT NULL,
+    changed_at DATETIME NOT NULL,
+    PRIMARY KEY (seq),
+    INDEX idx_change_entity (entity, seq),
+    INDEX idx_change_time (changed_at)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS change_sequence (
+    id INT NOT NULL,
+    seq BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO change_sequence (id, seq) SELECT 1, COALESCE(MAX(seq), 0) FROM change_log;
+
+-- "flask import" progress (app/importer.py)
+CREATE TABLE IF NOT EXISTS import_checkpoint (
+    source VARCHAR(255) NOT NULL,
+    position BIGINT NOT NULL DEFAULT 0,
+    inserted BIGINT NOT NULL DEFAULT 0,
+    rejected BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    PRIMARY KEY (source)
+) ENGINE=InnoDB;
+
+-- Export jobs (app/export.py); 0006 adds attempts
+CREATE TABLE IF NOT EXISTS export_job (
+    job_id INT NOT NULL AUTO_INCREMENT,
+    kind VARCHAR(20) NOT NULL,
+    format ENUM('csv', 'parquet') NOT NULL,
+    params TEXT NOT NULL,
+    status ENUM('queued', 'running', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    `rows` BIGINT NULL,
+    file VARCHAR(255) NULL,
+    error TEXT NULL,
+    created_at DATETIME NOT NULL,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    PRIMARY KEY (job_id),
+    INDEX idx_export_status (status, job_id)
+) ENGINE=InnoDB;
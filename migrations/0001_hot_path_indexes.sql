@@ -0,0 +1,21 @@
+-- Indexes for the lookups the handlers run on every request (app/migrate.py: "db explain").
+-- The ENUM columns already matched init.sql; only the models changed.
+
+-- POST /event_venues checks (ev_id, vn_id); the unique index makes duplicates impossible,
+-- so drop the ones a race may have left first (the oldest assignment stays)
+DELETE FROM event_venue
+WHERE ev_ven_id NOT IN (
+    SELECT keep FROM (SELECT MIN(ev_ven_id) AS keep FROM event_venue GROUP BY ev_id, vn_id) AS kept
+);
+CREATE UNIQUE INDEX unique_event_venue ON event_venue (ev_id, vn_id);
+
+-- GET /staff_venue/<vn_id>
+CREATE INDEX idx_staff_venue_venue ON staff_venue (vn_id);
+
+-- Venue and supplier names are unique by API contract: these fail if duplicates exist,
+-- rename them first
+CREATE UNIQUE INDEX idx_vn_name ON venue (vn_name);
+CREATE UNIQUE INDEX idx_company_name ON supplier (sup_company_name);
+
+-- Purchases of a ticket (GET /purchases?tic_id=, ticket delete, stats)
+CREATE INDEX idx_purchase_ticket ON purchase (tic_id);
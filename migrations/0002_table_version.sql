@@ -0,0 +1,13 @@
+-- Shared ETag / Last-Modified version counters (app/conditional.py). They used to live in
+-- each process's memory, so a write served by one gunicorn worker or pod left the others
+-- answering 304 with the old ETag.
+CREATE TABLE IF NOT EXISTS table_version (
+    table_name VARCHAR(64) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    modified_at DATETIME NOT NULL,
+    PRIMARY KEY (table_name)
+) ENGINE=InnoDB;
+
+-- One row per table up front: concurrent first bumps would otherwise take gap locks
+INSERT IGNORE INTO table_version (table_name, version, modified_at)
+SELECT table_name, 0, NOW() FROM information_schema.tables WHERE table_schema = DATABASE();
@@ -0,0 +1,13 @@
+-- change_log.seq is taken when the transaction commits instead of from AUTO_INCREMENT at insert
+-- time (app/changes.py): a transaction still open with a lower seq made GET /changes consumers
+-- move past changes that were committed later.
+CREATE TABLE IF NOT EXISTS change_sequence (
+    id INT NOT NULL,
+    seq BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB;
+
+-- 0000 may have seeded it already
+INSERT IGNORE INTO change_sequence (id, seq) SELECT 1, COALESCE(MAX(seq), 0) FROM change_log;
+
+ALTER TABLE change_log MODIFY seq BIGINT NOT NULL;
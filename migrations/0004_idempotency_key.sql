@@ -0,0 +1,13 @@
+-- Idempotency-Key responses (app/idempotency.py), shared by every worker and pod. They used to
+-- live in each process's cache, so a retry served by another worker ran the handler again.
+CREATE TABLE IF NOT EXISTS idempotency_key (
+    idem_key VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    owner VARCHAR(32) NULL,
+    status INT NULL,
+    body MEDIUMTEXT NULL,
+    headers TEXT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (idem_key),
+    INDEX idx_idempotency_expires (expires_at)
+) ENGINE=InnoDB;
@@ -0,0 +1,4 @@
+-- GET /purchases?sort=purchase_date and purchase_date__gte/__lt ranges (app/purchase_app.py):
+-- keyset pages are ordered by (purchase_date, att_id, tic_id), so the index serves both the
+-- range and the order without a filesort.
+CREATE INDEX idx_purchase_date ON purchase (purchase_date, att_id, tic_id);
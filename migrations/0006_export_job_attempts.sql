@@ -0,0 +1,3 @@
+-- Export jobs left "running" by a worker that died are taken over after EXPORT_TIMEOUT
+-- (app/export.py); attempts stops a job that keeps killing its workers.
+ALTER TABLE export_job ADD COLUMN attempts INT NOT NULL DEFAULT 0 AFTER status;
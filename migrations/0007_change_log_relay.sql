@@ -0,0 +1,8 @@
+-- change_log rows get their seq from changes.relay() after they are committed, instead of from
+-- change_sequence in the writing transaction (app/changes.py): that row lock made every commit
+-- that wrote an entity wait for the one before it. Rows are written with a change_id only.
+ALTER TABLE change_log
+    DROP PRIMARY KEY,
+    ADD COLUMN change_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST,
+    MODIFY seq BIGINT NULL,
+    ADD UNIQUE INDEX idx_change_seq (seq);
@@ -0,0 +1,8 @@
+-- ETag counters are bumped after the commit, on one of 16 shards per table, summed when read
+-- (app/conditional.py): the bump used to lock the table's single row until the writing
+-- transaction committed, so every write to a table waited for the previous one.
+-- The existing counters become shard 0.
+ALTER TABLE table_version
+    ADD COLUMN shard INT NOT NULL DEFAULT 0 AFTER table_name,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (table_name, shard);
@@ -0,0 +1,6 @@
+-- Indexes for the ENUM columns the collection endpoints filter on (?tic_type=, ?vn_type=,
+-- ?purchase_type=, see the filters= lists of the handlers): each one is followed by the
+-- primary key, so a filtered page is read in keyset order without scanning the table.
+CREATE INDEX idx_ticket_type ON ticket (tic_type, tic_id);
+CREATE INDEX idx_vn_type ON venue (vn_type, vn_id);
+CREATE INDEX idx_purchase_type ON purchase (purchase_type, att_id, tic_id);